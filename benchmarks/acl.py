@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import time
+
+from src.kernel import Kernel
+
+
+def generate_partition(files: int, acl_length: int, group_count: int) -> dict:
+    content = {}
+    for i in range(files):
+        acl = [f'group:acl{(i + j) % max(acl_length, 1)}:rw-' for j in range(acl_length // 2)] + \
+              [f'user:member{j}:r--' for j in range(acl_length - acl_length // 2)]
+        content[f'file{i}.txt'] = {'type': 'file', 'owner': 'root', 'group': f'group{i % max(group_count, 1)}',
+                                   'permissions': 640, 'acl': acl, 'content': f'file {i}'}
+    content['admin'] = {'type': 'directory', 'content': {'users': {'type': 'directory', 'content': {}}}}
+    return {'metadata': {'partition_label': 'Benchmark', 'superuser_group': 'admin'}, 'users': {},
+            'filesystem': {'root': {'type': 'directory', 'content': content}}}
+
+
+def check_read_only_entry():
+    with tempfile.TemporaryDirectory() as directory:
+        partition_path = os.path.join(directory, 'disc.json')
+        with open(partition_path, 'w') as partition_file:
+            json.dump(generate_partition(1, 0, 1), partition_file)
+        kernel = Kernel(partition_path, 'root', ['root'])
+        kernel.set_acl('/file0.txt', ['u:bob:r'])
+        assert kernel.get_acl('/file0.txt') == ['user:bob:r--']
+        with kernel.as_user('bob', ['nobody']):
+            assert not kernel.read('/file0.txt').denied
+            try:
+                kernel.append('/file0.txt', 'denied')
+            except Exception as error:
+                assert str(error) == 'Access denied'
+            else:
+                raise AssertionError('a read-only ACL entry allowed a write')
+
+
+def measure(kernel: Kernel, paths: list[str], groups: list[str], cold: bool) -> float:
+    nodes = [kernel.scandir('/').node.children[path] for path in paths]
+    with kernel.as_user('bob', groups):
+        started = time.perf_counter()
+        for node in nodes:
+            if cold:
+                kernel.permission_cache.invalidate_node(node)
+            kernel.can_read(node)
+        elapsed = time.perf_counter() - started
+    return elapsed / len(nodes)
+
+
+def main(files: int = 2000, sizes: tuple = (0, 8, 64, 512), group_counts: tuple = (1, 16, 256, 2048)):
+    check_read_only_entry()
+    print(f'{"acl entries":>12} {"groups":>8} {"cold check":>12} {"cached check":>14}')
+    for acl_length in sizes:
+        for group_count in group_counts:
+            partition = generate_partition(files, acl_length, group_count)
+            with tempfile.TemporaryDirectory() as directory:
+                partition_path = os.path.join(directory, 'disc.json')
+                with open(partition_path, 'w') as partition_file:
+                    json.dump(partition, partition_file)
+                kernel = Kernel(partition_path, 'root', ['root'])
+            paths = [f'file{i}.txt' for i in range(files)]
+            groups = [f'group{i}' for i in range(0, group_count, 2)] + [f'acl{i}' for i in range(0, acl_length, 3)] \
+                or ['nobody']
+            cold = min(measure(kernel, paths, groups, True) for _ in range(3))
+            cached = min(measure(kernel, paths, groups, False) for _ in range(3))
+            print(f'{acl_length:>12} {group_count:>8} {cold * 1e6:>10.2f}us {cached * 1e6:>12.2f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+import src.variant_options
+from src.credentials import CredentialCache, hash_password, check_password
+
+
+def median_time(action, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def calibrate(budget: float, start: int = 10_000) -> int:
+    iterations = start
+    while median_time(lambda: hash_password('calibration', iterations * 2), 3) <= budget:
+        iterations *= 2
+    return iterations
+
+
+def main(repeat: int = 5, cached_repeat: int = 10_000, alphabet: int = 36, length: int = 8):
+    budget = src.variant_options.login_latency_budget
+    iterations = src.variant_options.password_hash_iterations
+    encoded = hash_password('correct horse', iterations)
+    cache = CredentialCache()
+
+    uncached = median_time(lambda: check_password('correct horse', encoded), repeat)
+    failed = median_time(lambda: cache.verify('user', 'wrong guess', encoded), repeat)
+    cache.verify('user', 'correct horse', encoded)
+    cached = median_time(lambda: cache.verify('user', 'correct horse', encoded), cached_repeat)
+
+    guesses_per_second = 1 / uncached
+    years = alphabet ** length / guesses_per_second / (365 * 24 * 3600)
+    print(f'pbkdf2_sha256 with {iterations} iterations')
+    print(f'login (uncached): {uncached * 1000:.1f} ms, budget {budget * 1000:.0f} ms, '
+          f'{"within budget" if uncached <= budget else "OVER BUDGET"}')
+    print(f're-auth (cached): {cached * 1e6:.1f} us, failed attempt: {failed * 1000:.1f} ms')
+    print(f'brute force: {guesses_per_second:.1f} guesses/s per core, '
+          f'{years:.0f} core-years for {alphabet}^{length} passwords')
+    print(f'largest iteration count within budget on this machine: {calibrate(budget)}')
+
+
+if __name__ == '__main__':
+    main()
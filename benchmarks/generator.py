@@ -0,0 +1,66 @@
+import datetime
+import random
+import string
+
+from src.credentials import hash_password
+
+PERMISSIONS = (644, 640, 664, 600, 660, 666)
+CONTROL_QUESTIONS = ('Favourite colour?', 'Lucky number?', 'First pet name?', 'Home town?', 'Favourite food?',
+                     'Mother tongue?')
+
+
+def password_of(username: str) -> str:
+    return f'pw-{username}-1'
+
+
+def generate_partition(depth: int = 3, fan_out: int = 4, files_per_directory: int = 8, file_size: int = 256,
+                       users: int = 20, groups: int = 5, memberships: int = 2, seed: int = 0,
+                       hash_iterations: int = None) -> tuple[dict, dict]:
+    rng = random.Random(seed)
+    usernames = [f'user{i}' for i in range(users)]
+    group_names = [f'group{i}' for i in range(groups)]
+    member_of = {username: [username] + rng.sample(group_names, min(memberships, groups)) for username in usernames}
+    files, directories = [], []
+
+    def file_entry(owner: str) -> dict:
+        size = max(1, int(file_size * rng.uniform(0.5, 1.5)))
+        content = ''.join(rng.choices(string.ascii_letters + string.digits + ' \n', k=size))
+        return {'type': 'file', 'owner': owner, 'group': rng.choice(member_of[owner]),
+                'permissions': rng.choice(PERMISSIONS), 'content': content}
+
+    def directory(path: list, level: int) -> dict:
+        directories.append(path)
+        content = {}
+        for i in range(files_per_directory):
+            content[f'file{i}.txt'] = file_entry(rng.choice(usernames))
+            files.append(path + [f'file{i}.txt'])
+        if level < depth:
+            for i in range(fan_out):
+                content[f'dir{i}'] = directory(path + [f'dir{i}'], level + 1)
+        return {'type': 'directory', 'content': content}
+
+    today = datetime.date.today()
+    user_files = {}
+    credentials = {}
+    for username in usernames:
+        answers = '\n'.join(f' {i}: answer{i}' for i in rng.sample(range(1, len(CONTROL_QUESTIONS) + 1), 3))
+        user_files[username] = {'type': 'file', 'owner': 'root', 'group': 'admin', 'permissions': 660,
+                                'content': f'{username} *({today}) {",".join(member_of[username])}\nq:\n{answers}'}
+        credentials[username] = {'hashed_password': hash_password(password_of(username), hash_iterations),
+                                 'groups': member_of[username]}
+    homes = {username: {'type': 'directory', 'content': {'notes.txt': file_entry(username)}}
+             for username in usernames}
+    root = {'type': 'directory', 'content': {
+        'data': directory(['data'], 0),
+        'home': {'type': 'directory', 'content': homes},
+        'admin': {'type': 'directory', 'content': {
+            'users': {'type': 'directory', 'content': user_files},
+            'control_questions': {'type': 'file', 'owner': 'root', 'group': 'admin', 'permissions': 640,
+                                  'content': '\n'.join(CONTROL_QUESTIONS)},
+        }},
+    }}
+    partition = {'metadata': {'partition_label': 'Synthetic', 'superuser_group': 'admin'},
+                 'users': credentials, 'filesystem': {'root': root}}
+    layout = {'files': files, 'directories': directories, 'users': usernames, 'groups': group_names,
+              'member_of': member_of}
+    return partition, layout
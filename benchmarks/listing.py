@@ -0,0 +1,70 @@
+import random
+import time
+
+from src.commands import ls_lines
+from src.kernel import DirListing, mode_to_str
+from src.nodes import NameTable, FileNode, DirNode
+
+
+def legacy_mode_to_str(mode: int) -> str:
+    result = ''
+    value_letters = [(4, 'r'), (2, 'w'), (1, 'x')]
+    for shift in (6, 3, 0):
+        digit = mode >> shift & 7
+        for value, letter in value_letters:
+            if digit >= value:
+                result += letter
+                digit -= value
+            else:
+                result += '-'
+    return result
+
+
+def legacy_ls_lines(listing):
+    yield f'total {len(listing)}'
+    files: list = []
+    for entry in listing:
+        if entry.is_dir():
+            yield f'directory  \t\t\t{entry.name}'.expandtabs(12)
+        else:
+            files.append(entry)
+    for entry in files:
+        yield f'{legacy_mode_to_str(entry.node.mode)}  \t{entry.owner}\t{entry.group}\t{entry.name}'.expandtabs(12)
+
+
+def generate_listing(entries: int, users: int, seed: int) -> DirListing:
+    rng = random.Random(seed)
+    names = NameTable()
+    ids = [names.intern(f'user{i}') for i in range(users)]
+    children = {f'file{i}.txt': FileNode(rng.choice(ids), rng.choice(ids), rng.randrange(0o1000), f'file {i}')
+                for i in range(entries)}
+    return DirListing(DirNode(children), names, lambda node: True)
+
+
+def best_of(repeats: int, function) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(entries: int = 100_000, users: int = 50, repeats: int = 5, seed: int = 0):
+    listing = generate_listing(entries, users, seed)
+    modes = [node.mode for node in listing.node.children.values()]
+    assert [legacy_mode_to_str(mode) for mode in range(0o1000)] == [mode_to_str(mode) for mode in range(0o1000)]
+    results = [
+        ('permissions_str, per-call loops', best_of(repeats, lambda: [legacy_mode_to_str(mode) for mode in modes])),
+        ('permissions_str, mode table', best_of(repeats, lambda: [mode_to_str(mode) for mode in modes])),
+        ('ls, expandtabs rows', best_of(repeats, lambda: list(legacy_ls_lines(listing)))),
+        ('ls, aligned columns', best_of(repeats, lambda: list(ls_lines(listing, False)))),
+        ('ls -l, aligned columns', best_of(repeats, lambda: list(ls_lines(listing, True)))),
+    ]
+    print(f'{entries} entries, best of {repeats}')
+    for name, elapsed in results:
+        print(f'{name:<34} {elapsed * 1000:>9.2f} ms {elapsed / entries * 1e9:>9.0f} ns/entry')
+
+
+if __name__ == '__main__':
+    main()
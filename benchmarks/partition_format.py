@@ -0,0 +1,65 @@
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generator import generate_partition
+from src.convert import convert
+from src.kernel import Kernel
+
+
+def timed(action) -> float:
+    started = time.perf_counter()
+    action()
+    return time.perf_counter() - started
+
+
+def open_kernel(partition_path: str, lazy: bool = False) -> Kernel:
+    return Kernel(partition_path, 'root', ['root'], lazy=lazy)
+
+
+def chown_tree(entry: dict, owner: str):
+    if entry['type'] == 'file':
+        entry['owner'] = owner
+        return
+    for child in entry['content'].values():
+        chown_tree(child, owner)
+
+
+def main(fan_out: int = 8, depth: int = 3, files_per_directory: int = 20, reads: int = 20_000, writes: int = 50):
+    partition, layout = generate_partition(depth, fan_out, files_per_directory, file_size=32, users=4,
+                                           hash_iterations=1000)
+    chown_tree(partition['filesystem']['root'], 'root')  # every permission mode lets the owner read and write
+    paths = layout['files']
+    random.seed(0)
+    read_sample = [random.choice(paths) for _ in range(reads)]
+    write_sample = [random.choice(paths) for _ in range(writes)]
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'disc.json')
+        binary_path = os.path.join(directory, 'disc.sdsb')
+        with open(json_path, 'w') as partition_file:
+            json.dump(partition, partition_file, indent=4)
+        convert(json_path, binary_path)
+        print(f'files: {len(paths)}, json: {os.path.getsize(json_path)} bytes, '
+              f'binary: {os.path.getsize(binary_path)} bytes')
+
+        kernel = open_kernel(json_path, lazy=True)
+        kernel.flush()  # the first write lays the partition out and records the lazy index sidecar
+        kernel.close()
+        for label, partition_path, lazy in (('json', json_path, False), ('json lazy', json_path, True),
+                                            ('binary', binary_path, False)):
+            kernels = []
+            load_time = timed(lambda: kernels.append(open_kernel(partition_path, lazy)))
+            kernel = kernels[0]
+            read_time = timed(lambda: [kernel.read(path).content for path in read_sample])
+            write_time = timed(lambda: [kernel.write(path, f'rewritten {path[-1]}') for path in write_sample])
+            grow_time = timed(lambda: [kernel.write(path, 'grown ' * 64) for path in write_sample[:writes // 10]])
+            kernel.close()
+            print(f'{label:>10}: load {load_time * 1000:8.1f} ms, read {reads / read_time:10.0f} ops/s, '
+                  f'write that fits {writes / write_time:8.0f} ops/s, '
+                  f'growing write {writes // 10 / grow_time:8.0f} ops/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generator import generate_partition
+from src.kernel import Kernel
+from src.nodes import FileNode
+
+
+def add_chain(partition: dict, chain_depth: int) -> list:
+    directory = partition['filesystem']['root']
+    path = []
+    for i in range(chain_depth):
+        path.append(f'nested{i}')
+        directory['content'][f'nested{i}'] = {'type': 'directory', 'content': {}}
+        directory = directory['content'][f'nested{i}']
+    directory['content']['deep.txt'] = {'type': 'file', 'owner': 'root', 'group': 'root', 'permissions': 644,
+                                        'content': 'deep'}
+    return path + ['deep.txt']
+
+
+def tree_entry(kernel: Kernel, path: list):
+    # the lookup the kernel did before the flat index, one child table per path component
+    entry = kernel.root
+    try:
+        for path_part in path:
+            if isinstance(entry, FileNode):
+                raise KeyError(path_part)
+            entry = entry.children[path_part]
+    except KeyError:
+        raise ValueError(f'Invalid path: {"/" + "/".join(path)}')
+    return entry
+
+
+def timed(lookup, sample: list) -> float:
+    started = time.perf_counter()
+    for path in sample:
+        lookup(path)
+    return time.perf_counter() - started
+
+
+def main(depth: int = 4, fan_out: int = 10, files_per_directory: int = 10, chain_depth: int = 200,
+         lookups: int = 100_000):
+    partition, layout = generate_partition(depth, fan_out, files_per_directory, file_size=16, users=4,
+                                           hash_iterations=1000)
+    deep_path = add_chain(partition, chain_depth)
+    with tempfile.TemporaryDirectory() as directory:
+        partition_path = os.path.join(directory, 'disc.json')
+        with open(partition_path, 'w') as partition_file:
+            json.dump(partition, partition_file)
+        started = time.perf_counter()
+        kernel = Kernel(partition_path, 'root', ['root'])
+        load_time = time.perf_counter() - started
+        kernel.close()
+
+    walk_entry = functools.partial(tree_entry, kernel)
+    index_entry = kernel._Kernel__get_filesystem_entry
+    random.seed(0)
+    sample = [random.choice(layout['files']) for _ in range(lookups)]
+    for path in sample[:100] + [deep_path]:
+        assert walk_entry(path) is index_entry(path)
+    print(f'entries: {len(kernel.index)}, load + index build: {load_time:.3f}s')
+    print(f'{lookups} random lookups: tree walk {timed(walk_entry, sample):.3f}s, '
+          f'flat index {timed(index_entry, sample):.3f}s')
+    deep_sample = [deep_path] * lookups
+    print(f'{lookups} lookups at depth {len(deep_path)}: '
+          f'tree walk {timed(walk_entry, deep_sample):.3f}s, '
+          f'flat index {timed(index_entry, deep_sample):.3f}s')
+
+
+if __name__ == '__main__':
+    main()
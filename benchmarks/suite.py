@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import src.variant_options
+from benchmarks.generator import generate_partition, password_of
+from src.auth import verify
+from src.convert import convert
+from src.kernel import Kernel
+from src.shell import Shell
+
+SCALES = {
+    'small': {'depth': 2, 'fan_out': 4, 'files_per_directory': 8, 'file_size': 256, 'users': 10, 'groups': 4},
+    'medium': {'depth': 3, 'fan_out': 6, 'files_per_directory': 12, 'file_size': 512, 'users': 50, 'groups': 8},
+    'large': {'depth': 4, 'fan_out': 6, 'files_per_directory': 16, 'file_size': 1024, 'users': 200, 'groups': 16},
+}
+STORAGES = {
+    'json': {},
+    'lazy': {'lazy': True},
+    'journal': {'journal': True, 'lazy': True},
+    'binary': {},
+}
+
+
+def drain(result):
+    if result is not None and not isinstance(result, str):
+        for _ in result:
+            pass
+
+
+def read_heavy(kernel: Kernel, layout: dict, rng: random.Random, ops: int):
+    shell = Shell(kernel, authenticate=False)
+    kernel.set_user(rng.choice(layout['users']))
+    for _ in range(ops):
+        if rng.random() < 0.7:
+            path = rng.choice(layout['files'])
+            shell.workdir = path[:-1]
+            yield lambda: drain(shell.exec(f'cat {path[-1]}'))
+        else:
+            shell.workdir = rng.choice(layout['directories'])
+            yield lambda: drain(shell.exec('ls'))
+
+
+def write_heavy(kernel: Kernel, layout: dict, rng: random.Random, ops: int):
+    shell = Shell(kernel, authenticate=False)
+    username = rng.choice(layout['users'])
+    kernel.set_user(username)
+    shell.workdir = ['home', username]
+    for i in range(ops):
+        name = f'out{rng.randrange(max(1, ops // 4))}.txt'
+        yield lambda: drain(shell.exec(f'echo line{i} > {name}'))
+
+
+def user_admin(kernel: Kernel, layout: dict, rng: random.Random, ops: int):
+    src.variant_options.max_users_amount = len(layout['users']) + ops
+    for i in range(ops):
+        if i % 2:
+            username, group = rng.choice(layout['users']), rng.choice(layout['groups'])
+            if group in kernel.get_user(username).groups:
+                yield lambda: kernel.remove_user_group(username, group)
+            else:
+                yield lambda: kernel.add_user_group(username, group)
+        else:
+            yield lambda: kernel.create_user(f'created{i}')
+
+
+def login(kernel: Kernel, layout: dict, rng: random.Random, ops: int):
+    for _ in range(ops):
+        username = rng.choice(layout['users'])
+        password = password_of(username) if rng.random() < 0.9 else 'wrong password'
+        yield lambda: verify(kernel, username, password)
+
+
+SCENARIOS = {'read_heavy': read_heavy, 'write_heavy': write_heavy, 'user_admin': user_admin, 'login': login}
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run_scenario(name: str, partition_path: str, layout: dict, storage: str, ops: int, seed: int,
+                 hash_iterations: int) -> dict:
+    rng = random.Random(seed)
+    src.variant_options.password_hash_iterations = hash_iterations
+    kernel = Kernel(partition_path, 'root', ['root', 'admin'], **STORAGES[storage])
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        for operation in SCENARIOS[name](kernel, layout, rng, ops):
+            operation_started = time.perf_counter()
+            try:
+                operation()
+            except Exception:
+                pass  # denied and failing operations are part of the workload
+            latencies.append(time.perf_counter() - operation_started)
+        elapsed = time.perf_counter() - started
+    kernel.close()
+    latencies.sort()
+    return {'ops': len(latencies), 'ops_per_second': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    for key, current in results['results'].items():
+        previous = baseline['results'].get(key)
+        if previous is None:
+            continue
+        change = (current['ops_per_second'] / previous['ops_per_second'] - 1) * 100
+        print(f'{key:<24} {previous["ops_per_second"]:>10.0f} -> {current["ops_per_second"]:>10.0f} ops/s '
+              f'({change:+.1f}%), p99 {previous["p99_ms"]:.3f} -> {current["p99_ms"]:.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the SDSS benchmark suite')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--storage', choices=STORAGES, action='append')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append')
+    parser.add_argument('--ops', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hash-iterations', type=int, default=10_000)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    arguments = parser.parse_args()
+
+    parameters = {**SCALES[arguments.scale], 'seed': arguments.seed, 'hash_iterations': arguments.hash_iterations}
+    partition, layout = generate_partition(**parameters)
+    results = {'commit': git_commit(), 'python': platform.python_version(), 'scale': arguments.scale,
+               'parameters': parameters, 'ops': arguments.ops, 'results': {}}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'disc.json')
+        binary_path = os.path.join(directory, 'disc.sdsb')
+        with open(json_path, 'w') as partition_file:
+            json.dump(partition, partition_file, indent=4)
+        convert(json_path, binary_path)
+        for storage in arguments.storage or ['json']:
+            for name in arguments.scenario or SCENARIOS:
+                scratch = os.path.join(directory, f'{storage}-{name}')
+                os.mkdir(scratch)
+                source = binary_path if storage == 'binary' else json_path
+                partition_path = os.path.join(scratch, os.path.basename(source))
+                with open(source, 'rb') as original, open(partition_path, 'wb') as copy:
+                    copy.write(original.read())
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    result = pool.submit(run_scenario, name, partition_path, layout, storage, arguments.ops,
+                                         arguments.seed, arguments.hash_iterations).result()
+                results['results'][f'{storage}/{name}'] = result
+                print(f'{storage + "/" + name:<24} {result["ops_per_second"]:>10.0f} ops/s  '
+                      f'p50 {result["p50_ms"]:8.3f} ms  p99 {result["p99_ms"]:8.3f} ms  '
+                      f'peak rss {result["peak_rss_kb"] / 1024:7.1f} MiB')
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(results, output, indent=4)
+    if arguments.compare:
+        with open(arguments.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
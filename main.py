@@ -1,24 +1,77 @@
+import argparse
+import os
+import sys
+from getpass import getpass
+
+from src.auth import verify
+from src.batch import run_batch
 from src.kernel import Kernel
 from src.shell import Shell
+from src.confirmation import ConfirmationScheduler
+
 
-from datetime import datetime, timedelta
+def main():
+    parser = argparse.ArgumentParser(description='SDSS shell')
+    parser.add_argument('partition', nargs='?', default='disc.json')
+    parser.add_argument('--batch', nargs='?', const='-', metavar='FILE',
+                        help='run commands from FILE (or stdin) instead of the interactive shell')
+    parser.add_argument('--user', default='andrew', help='user to run the batch as')
+    parser.add_argument('--mount', action='append', default=[], metavar='PATH=PARTITION',
+                        help='attach a partition file under PATH, relative partitions live next to the main one')
+    arguments = parser.parse_args()
 
-kernel = Kernel('disc.json', 'andrew', ['andrew', 'storage', 'admin'])
+    kernel = Kernel(arguments.partition, 'andrew', ['andrew', 'storage', 'admin'], journal=True, lazy=True)
+    for mount in arguments.mount:
+        mount_path, _, mount_partition = mount.partition('=')
+        with kernel.as_user('root', ['root']):
+            kernel.mount(mount_path, mount_partition)
 
-shell = Shell(kernel)
+    if arguments.batch is None and not sys.stdin.isatty():
+        arguments.batch = '-'
 
-time_of_user_comfirmation = datetime.now() + timedelta(seconds=20)
-while shell.active:
-    user_input = input(shell.prompt())
-    command_result = shell.exec(user_input)
-    if command_result:
-        print(command_result)
-    if datetime.now() >= time_of_user_comfirmation:
+    if arguments.batch is not None:
+        password = os.environ.get('SDSS_PASSWORD')
+        if password is None:
+            password = getpass(f'Enter password for {arguments.user}: ')
         try:
-            kernel.confirm_identity(kernel.username)
+            authenticated = verify(kernel, arguments.user, password)
         except Exception as error:
-            print(str(error))
+            authenticated = False
+            print(f'authentication error: {error}', file=sys.stderr)
+        if not authenticated:
+            kernel.close()
+            sys.exit('authentication error: Wrong password')
+        kernel.set_user(arguments.user)
+        shell = Shell(kernel, authenticate=False)
+        try:
+            if arguments.batch == '-':
+                _, failures = run_batch(shell, sys.stdin)
+            else:
+                with open(arguments.batch, encoding='utf-8') as script:
+                    _, failures = run_batch(shell, script)
+        finally:
+            kernel.close()
+        sys.exit(1 if failures else 0)
+
+    scheduler = ConfirmationScheduler()
+    shell = Shell(kernel, scheduler=scheduler)
+
+    while shell.active:
+        for session in scheduler.pop_due():
+            print(session.start_confirmation())
+        user_input = input(shell.prompt())
+        command_result = shell.exec(user_input)
+        if isinstance(command_result, str):
+            print(command_result)
+        elif command_result:
+            for line in command_result:
+                print(line)
+        if shell.identity_failed:
             print("Identity not confirmed. Logging out...")
-            shell.authentication()
-        time_of_user_comfirmation = datetime.now() + timedelta(minutes=1)
+            shell.reauthenticate()
+
+    kernel.close()
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+from src.nodes import NameTable, FileNode
+
+
+class GroupBits:
+    def __init__(self, names: NameTable):
+        self.names: NameTable = names
+        self.masks: dict[tuple, tuple[int, int]] = {}
+        self.last: tuple = (None, 0, 0)
+
+    def __call__(self, groups: list[str] | tuple) -> int:
+        known = len(self.names.names)
+        last = self.last
+        if last[0] is groups and last[1] == known:
+            return last[2]
+        key = tuple(groups)
+        cached = self.masks.get(key)
+        if cached is not None and cached[0] == known:
+            bits = cached[1]
+        else:
+            bits = 0
+            for group in key:
+                group_id = self.names.ids.get(group)
+                if group_id is not None:
+                    bits |= 1 << group_id
+            self.masks[key] = (known, bits)
+        self.last = (groups, known, bits)
+        return bits
+
+
+def effective_mask(node: FileNode, user: int | None, group_bits: int) -> int:
+    if node.owner == user:
+        return node.mode >> 6 & 7
+    acl = node.acl
+    if acl is not None and user in acl.users:
+        return acl.users[user]
+    mask = node.mode >> 3 & 7 if group_bits >> node.group & 1 else None
+    if acl is not None:
+        named = acl.group_mask(group_bits)
+        if named is not None:
+            mask = named if mask is None else mask | named
+    return node.mode & 7 if mask is None else mask
@@ -6,17 +6,29 @@ from src.kernel import Kernel
 from src.variant_options import password_expire_time
 
 
-def __check_password(kernel: Kernel, username: str, password: str):
-    password_data = kernel.get_user_password(username)
-    correct_password = password_data["password"]
-    password_creation_date = datetime.strptime(password_data["creation_date"], "%Y-%m-%d")
+def __check_password(kernel: Kernel, username: str, password: str, upgrade: bool = True) -> str:
+    record = kernel.get_user(username)
+    password_creation_date = datetime.combine(record.creation_date, datetime.min.time())
     password_expiration_day = password_creation_date + timedelta(days=password_expire_time)
     if datetime.today() > password_expiration_day:
         raise Exception("Your password expired, set new one")
-    else:
-        print("Your password will expire {}".format(password_expiration_day))
-    if password != correct_password:
+    if not kernel.verify_password(username, password, upgrade):
         raise ValueError("Wrong password")
+    return "Your password will expire {}".format(password_expiration_day)
+
+
+def verify(kernel: Kernel, username: str, password: str, notices: list[str] = None, upgrade: bool = True) -> bool:
+    if username not in kernel.get_existing_users():
+        raise ValueError("User don't exist")
+    try:
+        notice = __check_password(kernel, username, password, upgrade)
+    except ValueError:
+        return False
+    if notices is None:
+        print(notice)
+    else:
+        notices.append(notice)
+    return True
 
 
 def auth(kernel: Kernel):
@@ -25,7 +37,7 @@ def auth(kernel: Kernel):
         raise ValueError("User don't exist")
     password = getpass("Enter your password: ")
     try:
-        __check_password(kernel, username, password)
+        print(__check_password(kernel, username, password))
     except ValueError as error:
         print("authentication error: Wrong password")
         return False, username
@@ -0,0 +1,48 @@
+import sys
+import time
+from typing import Iterable
+
+from src.commands import CommandError
+from src.shell import Shell
+
+transaction_ends = {'commit', 'rollback'}
+
+
+def run_batch(shell: Shell, lines: Iterable[str], output=sys.stdout, errors=sys.stderr) -> tuple[int, int]:
+    executed = failures = 0
+    skipping = False
+    started = time.perf_counter()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        command = line.split()[0]
+        if skipping:
+            skipping = command not in transaction_ends
+            continue
+        try:
+            result = shell.exec(line)
+            if result is not None and not isinstance(result, str):
+                result = '\n'.join(result)
+        except Exception as error:
+            result = CommandError(f'{command}: {error}')
+        executed += 1
+        if isinstance(result, CommandError):
+            failures += 1
+            print(f'line {number}: {result}', file=errors)
+            if shell.kernel.transaction is not None:
+                shell.kernel.rollback()
+                skipping = True
+                print(f'line {number}: transaction rolled back', file=errors)
+        elif result is not None:
+            print(result, file=output)
+        if not shell.active:
+            break
+    if shell.kernel.transaction is not None:
+        shell.kernel.rollback()
+        failures += 1
+        print('batch: transaction not committed, rolled back', file=errors)
+    elapsed = time.perf_counter() - started
+    rate = executed / elapsed if elapsed else 0
+    print(f'{executed} commands in {elapsed:.3f} s ({rate:.0f} commands/s), {failures} failed', file=errors)
+    return executed, failures
@@ -0,0 +1,270 @@
+import json
+import mmap
+import os
+import struct
+
+from src.nodes import NameTable, FileNode, DirNode, MappedContent, AppendedContent, Acl
+
+MAGIC = b'SDSB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQIIQIQQQ')
+INODE = struct.Struct('<IIHBxHIIQII')
+NO_PARENT = 0xFFFFFFFF
+DIRECTORY, FILE = 0, 1
+
+
+def capacity_for(length: int, minimum: int = 16) -> int:
+    return max(minimum, (length + length // 4 + 15) // 16 * 16)
+
+
+def is_binary_partition(path: str) -> bool:
+    try:
+        with open(path, 'rb') as partition_file:
+            return partition_file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class BinarySource:
+    def __init__(self, path: str):
+        with open(path, 'rb') as partition_file:
+            self.map: mmap.mmap = mmap.mmap(partition_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view: memoryview = memoryview(self.map)
+
+    def text(self, offset: int, length: int) -> str:
+        return str(self.view[offset:offset + length], 'utf-8')
+
+
+class Layout:
+    def __init__(self, inodes: dict, records: list[bytes], meta_offset: int, meta_capacity: int,
+                 inodes_offset: int, data_offset: int, header: tuple):
+        self.inodes: dict[FileNode | DirNode, int] = inodes
+        self.records: list[bytes] = records
+        self.meta_offset: int = meta_offset
+        self.meta_capacity: int = meta_capacity
+        self.inodes_offset: int = inodes_offset
+        self.data_offset: int = data_offset
+        self.header: tuple = header
+        self.acls: dict[int, Acl] = {}
+        self.source: BinarySource | None = None
+
+    def patched(self, records: list[bytes], header: tuple) -> 'Layout':
+        layout = Layout(self.inodes, records, self.meta_offset, self.meta_capacity, self.inodes_offset,
+                        self.data_offset, header)
+        layout.acls = self.acls
+        layout.source = self.source
+        return layout
+
+    @property
+    def meta(self) -> bytes:
+        return self.source.map[self.meta_offset:self.meta_offset + self.header[5]]
+
+
+class BinarySnapshot:
+    def __init__(self, layout: Layout):
+        self.layout: Layout = layout
+        self.chunks: list[bytes] = []
+        self.patches: list[tuple[int, bytes]] = []
+        self.files: list[tuple[FileNode, int, int, int]] = []
+
+    @property
+    def in_place(self) -> bool:
+        return not self.chunks
+
+    @property
+    def size(self) -> int:
+        return sum(map(len, self.chunks)) + sum(len(data) for _, data in self.patches)
+
+
+class BinaryStorage:
+    def __init__(self, path: str):
+        self.path: str = path
+        self.layout: Layout | None = None
+        self.dirty: set[FileNode] = set()
+        self.reshaped: bool = False
+
+    def store_content(self, content: str):
+        return content
+
+    def append_content(self, data, suffix: str):
+        if data.__class__ is str:
+            return data + suffix
+        if data.__class__ is AppendedContent:
+            return AppendedContent(data.base, data.suffix + suffix)
+        return AppendedContent(data, suffix)
+
+    def release_content(self, data):
+        pass
+
+    def retain_content(self, data):
+        pass
+
+    def node_changed(self, node: FileNode, ancestors: list[DirNode]):
+        self.dirty.add(node)
+
+    def tree_changed(self, ancestors: list[DirNode]):
+        self.reshaped = True
+
+    def load(self) -> tuple[dict, DirNode, NameTable]:
+        source = BinarySource(self.path)
+        header = HEADER.unpack_from(source.map, 0)
+        magic, version, _, inode_count, meta_offset, meta_length, meta_capacity, names_offset, names_length, \
+            inodes_offset, data_offset, _ = header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Unsupported partition format: {self.path}')
+        meta = json.loads(source.map[meta_offset:meta_offset + meta_length])
+        names = NameTable()
+        for name in meta['names']:
+            names.intern(name)
+        entry_names = source.map[names_offset:names_offset + names_length]
+        table = source.map[inodes_offset:inodes_offset + inode_count * INODE.size]
+        nodes: list[FileNode | DirNode] = []
+        for parent, name_offset, name_length, kind, mode, owner, group, offset, length, capacity in \
+                INODE.iter_unpack(table):
+            if kind == DIRECTORY:
+                node = DirNode()
+            else:
+                node = FileNode(owner, group, mode, MappedContent(source, data_offset + offset, length, capacity))
+            if parent != NO_PARENT:
+                nodes[parent].children[entry_names[name_offset:name_offset + name_length].decode('utf-8')] = node
+            nodes.append(node)
+        records = [table[i:i + INODE.size] for i in range(0, len(table), INODE.size)]
+        self.layout = Layout({node: i for i, node in enumerate(nodes)}, records, meta_offset, meta_capacity,
+                             inodes_offset, data_offset, header)
+        self.layout.source = source
+        for i, entries in meta.get('acls', {}).items():
+            node = nodes[int(i)]
+            node.acl = self.layout.acls[int(i)] = Acl.parse(entries, names)
+        self.dirty, self.reshaped = set(), False
+        return meta['partition'], nodes[0], names
+
+    def __flatten(self, node: FileNode | DirNode, parent: int, name: str, entries: list):
+        index = len(entries)
+        entries.append((parent, name, node))
+        if isinstance(node, DirNode):
+            for child_name, child in node.children.items():
+                self.__flatten(child, index, child_name, entries)
+
+    @staticmethod
+    def __content_bytes(data) -> bytes:
+        if data.__class__ is MappedContent:
+            return data.raw()
+        if data.__class__ is str:
+            return data.encode('utf-8')
+        return data.load().encode('utf-8')
+
+    @staticmethod
+    def __meta(partition: dict, names: NameTable, acls: dict[int, Acl]) -> bytes:
+        meta = {'partition': partition, 'names': names.names}
+        if acls:
+            meta['acls'] = {str(i): acl.entries(names) for i, acl in acls.items()}
+        return json.dumps(meta, separators=(',', ':')).encode('utf-8')
+
+    def encode(self, partition: dict, root: DirNode, names: NameTable) -> BinarySnapshot:
+        dirty, self.dirty = self.dirty, set()
+        if self.layout is not None and not self.reshaped:
+            meta = self.__meta(partition, names, self.layout.acls)
+            if len(meta) <= self.layout.meta_capacity:
+                snapshot = self.__encode_patch(dirty, meta)
+                if snapshot is not None:
+                    return snapshot
+        self.reshaped = False
+        entries: list[tuple[int, str, FileNode | DirNode]] = []
+        self.__flatten(root, NO_PARENT, '', entries)
+        acls = {i: node.acl for i, (_, _, node) in enumerate(entries)
+                if isinstance(node, FileNode) and node.acl is not None}
+        snapshot = self.__encode_full(entries, self.__meta(partition, names, acls))
+        snapshot.layout.acls = acls
+        return snapshot
+
+    def __encode_patch(self, dirty: set[FileNode], meta: bytes) -> BinarySnapshot | None:
+        layout = self.layout
+        records = list(layout.records)
+        header = list(layout.header)
+        snapshot = BinarySnapshot(layout)
+        for node in dirty:
+            i = layout.inodes.get(node)
+            if i is None or node.acl is not layout.acls.get(i):
+                return None
+            parent, name_offset, name_length, kind, _, _, _, offset, length, capacity = INODE.unpack(records[i])
+            data = node.data
+            if data.__class__ is AppendedContent and data.base.__class__ is MappedContent and \
+                    data.base.source is layout.source and data.base.offset == layout.data_offset + offset and \
+                    data.base.length == length:
+                patch = data.suffix.encode('utf-8')
+                patch_offset = offset + length
+            else:
+                patch = self.__content_bytes(data)
+                patch_offset = offset
+            length = patch_offset - offset + len(patch)
+            if length > capacity:
+                return None
+            snapshot.patches.append((layout.data_offset + patch_offset, patch))
+            snapshot.files.append((node, layout.data_offset + offset, length, capacity))
+            records[i] = INODE.pack(parent, name_offset, name_length, kind, node.mode, node.owner, node.group,
+                                    offset, length, capacity)
+            snapshot.patches.append((layout.inodes_offset + i * INODE.size, records[i]))
+        if meta != layout.meta:
+            header[5] = len(meta)
+            snapshot.patches.append((layout.meta_offset, meta))
+            snapshot.patches.append((0, HEADER.pack(*header)))
+        snapshot.layout = layout.patched(records, tuple(header))
+        return snapshot
+
+    def __encode_full(self, entries: list, meta: bytes) -> BinarySnapshot:
+        entry_names = bytearray()
+        name_refs = []
+        for _, name, _ in entries:
+            encoded = name.encode('utf-8')
+            name_refs.append((len(entry_names), len(encoded)))
+            entry_names += encoded
+        meta_offset = HEADER.size
+        meta_capacity = capacity_for(len(meta), 256)
+        names_offset = meta_offset + meta_capacity
+        inodes_offset = names_offset + len(entry_names)
+        data_offset = inodes_offset + len(entries) * INODE.size
+        records, data_chunks, files = [], [], []
+        data_length = 0
+        for (parent, _, node), name_ref in zip(entries, name_refs):
+            if isinstance(node, DirNode):
+                records.append(INODE.pack(parent, *name_ref, DIRECTORY, 0, 0, 0, 0, 0, 0))
+                continue
+            content = self.__content_bytes(node.data)
+            capacity = capacity_for(len(content))
+            records.append(INODE.pack(parent, *name_ref, FILE, node.mode, node.owner, node.group, data_length,
+                                      len(content), capacity))
+            files.append((node, data_offset + data_length, len(content), capacity))
+            data_chunks.append(content.ljust(capacity, b'\0'))
+            data_length += capacity
+        header = (MAGIC, VERSION, 0, len(entries), meta_offset, len(meta), meta_capacity, names_offset,
+                  len(entry_names), inodes_offset, data_offset, data_length)
+        snapshot = BinarySnapshot(Layout({node: i for i, (_, _, node) in enumerate(entries)}, records, meta_offset,
+                                         meta_capacity, inodes_offset, data_offset, header))
+        snapshot.files = files
+        snapshot.chunks = [HEADER.pack(*header), meta.ljust(meta_capacity, b'\0'), bytes(entry_names),
+                           b''.join(records), *data_chunks]
+        return snapshot
+
+    def write(self, snapshot: BinarySnapshot, repoint: bool = True):
+        if snapshot.in_place:
+            if snapshot.patches:
+                with open(self.path, 'r+b') as partition_file:
+                    for offset, data in snapshot.patches:
+                        os.pwrite(partition_file.fileno(), data, offset)
+                    os.fsync(partition_file.fileno())
+        else:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as partition_file:
+                partition_file.writelines(snapshot.chunks)
+                partition_file.flush()
+                os.fsync(partition_file.fileno())
+            os.replace(tmp_path, self.path)
+            snapshot.layout.source = BinarySource(self.path)
+        self.layout = snapshot.layout
+        if repoint:
+            for node, offset, length, capacity in snapshot.files:
+                node.data = MappedContent(self.layout.source, offset, length, capacity)
+
+    def close(self):
+        self.layout = None
+
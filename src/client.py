@@ -0,0 +1,44 @@
+import argparse
+import json
+import socket
+from getpass import getpass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open a shell session on a running kernel server')
+    parser.add_argument('--socket', default='sdss.sock')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int)
+    arguments = parser.parse_args()
+    if arguments.port:
+        connection = socket.create_connection((arguments.host, arguments.port))
+    else:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(arguments.socket)
+    stream = connection.makefile('rw')
+
+    def request(**message) -> dict:
+        stream.write(json.dumps(message) + '\n')
+        stream.flush()
+        return json.loads(stream.readline())
+
+    response = request(op='login', username=input("Input your username: "), password=getpass("Enter your password: "))
+    while response['ok']:
+        for notice in response.get('notices', ()):
+            print(notice)
+        prompt = response['prompt']
+        response = request(op='exec', command=input(prompt))
+        if not response['ok']:
+            print(response['error'])
+            response = {'ok': True, 'prompt': prompt}
+        elif response['output'] == 'exit':
+            break
+        elif response['output']:
+            print(response['output'])
+    else:
+        print("authentication error: {}".format(response['error']))
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,26 @@
-from .kernel import File, Directory, Kernel
+from .kernel import Directory, Kernel
+from .nodes import parse_entry
+from .provisioning import import_users, parse_records
 from getpass import getpass
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+import collections
+import io
+import itertools
+import os
+import re
+
+import src.variant_options
+
+
+class CommandError(str):
+    pass
 
 
 def echo(command: list[str], kernel: Kernel, workdir: list[str]):
     if len(command) == 1:
-        return 'USAGE: echo <message> [> filename]', workdir
-    if len(command) == 2:
-        return ' '.join(command[1:]), workdir
-    if len(command) > 3:
-        try:
-            if command[3][0] == '/':
-                kernel.write(kernel.parse_path(command[3]), command[1])
-            else:
-                kernel.write(workdir + [command[3]], command[1])
-        except ValueError:
-            return 'echo: Invalid argument', workdir
-        finally:
-            return None, workdir
+        return CommandError('USAGE: echo <message> [> filename]'), workdir
+    return ' '.join(command[1:]), workdir
 
 
 def cd(command: list[str], kernel, workdir: str):
@@ -28,7 +32,7 @@ def cd(command: list[str], kernel, workdir: str):
             try:
                 kernel.get_directory_content(command[1])
             except ValueError:
-                return 'Invalid path', workdir
+                return CommandError('Invalid path'), workdir
             else:
                 return None, kernel.parse_path(command[1])
         elif command[1] == '..':
@@ -41,79 +45,438 @@ def cd(command: list[str], kernel, workdir: str):
             try:
                 kernel.get_directory_content(new_workdir)
             except ValueError:
-                return 'Invalid path', workdir
+                return CommandError('Invalid path'), workdir
             else:
                 return None, new_workdir
 
 
 def ls(command: list[str], kernel, workdir: list):
-    files: list = []
-    dirs: list = []
+    match command[1:]:
+        case ['-l', *path] if len(path) <= 1:
+            long = True
+        case [*path] if len(path) <= 1 and not (path and path[0].startswith('-')):
+            long = False
+        case _:
+            return CommandError('USAGE: ls [-l] [path]'), workdir
     try:
-        dir_content = kernel.get_directory_content(workdir)
+        listing = kernel.scandir(__resolve(kernel, workdir, path[0]) if path else workdir)
     except ValueError:
-        raise ValueError('Invalid path')
-    for obj in dir_content:
-        entry = kernel.read(workdir + [obj])
-        if isinstance(entry, File):
-            files.append(f'{entry.permissions_str}  \t{entry.owner}\t{entry.group}\t{entry.filename}'.expandtabs(12))
-        elif isinstance(entry, Directory):
-            dirs.append(f'directory  \t\t\t{entry.name}'.expandtabs(12))
-    if dirs:
-        dirs.append('')
-    return f'total {len(dir_content)}\n' + '\n'.join(dirs) + '\n'.join(files), workdir
+        return CommandError('ls: Invalid path'), workdir
+    return ls_lines(listing, long), workdir
+
+
+def ls_lines(listing, long: bool):
+    # columns are padded once per listing and modes come from the precomputed table, rows are plain concatenation
+    yield f'total {len(listing)}'
+    entries = list(listing)
+    files = [entry for entry in entries if not entry.is_dir()]
+    owners, owner_width = __cells({entry.owner for entry in files})
+    groups, group_width = __cells({entry.group for entry in files})
+    padding = ' ' * (owner_width + group_width + 4)
+    if long:
+        sizes = [str(entry.size) for entry in files]
+        size_width = max(map(len, sizes), default=0)
+        padding += ' ' * (size_width + 2)
+    for entry in entries:
+        if entry.is_dir():
+            yield f'directory  {padding}{entry.name}'
+    if long:
+        yield from (f'{entry.permissions_str}  {owners[entry.owner]}  {groups[entry.group]}  '
+                    f'{size.rjust(size_width)}  {entry.name}' for entry, size in zip(files, sizes))
+    else:
+        yield from (f'{entry.permissions_str}  {owners[entry.owner]}  {groups[entry.group]}  {entry.name}'
+                    for entry in files)
+
+
+def __cells(names: set[str]) -> tuple[dict[str, str], int]:
+    width = max(map(len, names), default=0)
+    return {name: name.ljust(width) for name in names}, width
 
 
 def cat(command: list[str], kernel, workdir: list):
     if len(command) == 1:
-        return 'USAGE: cat <filename>', workdir
+        return CommandError('USAGE: cat <filename>'), workdir
+    return __file_lines('cat', kernel, __resolve(kernel, workdir, command[1])), workdir
+
+
+def __file_lines(name: str, kernel, path: list):
     try:
-        file = kernel.read(workdir + [command[1]])
+        if isinstance(kernel.read(path), Directory):
+            return CommandError(f'{name}: You can read only files')
+        chunks = kernel.iter_read(path)
+    except ValueError:
+        return CommandError('Invalid filename')
+    except Exception:
+        return CommandError(f'{name}: Access denied')
+    return __split_lines(chunks)
+
+
+def __split_lines(chunks):
+    partial = []
+    for chunk in chunks:
+        lines = chunk.split('\n')
+        if len(lines) == 1:
+            partial.append(chunk)
+            continue
+        partial.append(lines[0])
+        yield ''.join(partial)
+        yield from lines[1:-1]
+        partial = [lines[-1]]
+    yield ''.join(partial)
+
+
+def __tail_lines(name: str, kernel, path: list, count: int):
+    try:
+        if isinstance(kernel.read(path), Directory):
+            return CommandError(f'{name}: You can read only files')
+        with kernel.open(path) as file:
+            end, chunks, newlines = file.seek(0, 2), [], 0
+            while end > 0 and newlines < count:
+                start = max(end - src.variant_options.read_chunk_size, 0)
+                chunk = file.pread(start, end - start)
+                chunks.append(chunk)
+                newlines += chunk.count(b'\n')
+                end = start
+    except ValueError:
+        return CommandError('Invalid filename')
+    except Exception:
+        return CommandError(f'{name}: Access denied')
+    lines = b''.join(reversed(chunks)).decode('utf-8', errors='replace').split('\n')
+    return lines[-count:] if count else []
+
+
+def stat(command: list[str], kernel, workdir: list):
+    if len(command) != 2:
+        return CommandError('USAGE: stat <path>'), workdir
+    path = __resolve(kernel, workdir, command[1])
+    try:
+        file = kernel.read(path)
         if isinstance(file, Directory):
-            return 'cat: You can read only files', workdir
+            fields = [('File', __display(tuple(path))), ('Type', 'directory'),
+                      ('Entries', len(kernel.get_directory_content(path)))]
+        else:
+            fields = [('File', __display(tuple(path))), ('Type', 'file'), ('Size', file.size),
+                      ('Access', f'{file.permissions:03d}/{file.permissions_str}'), ('Owner', file.owner),
+                      ('Group', file.group), ('ACL', len(kernel.get_acl(path)))]
+    except ValueError:
+        return CommandError('stat: Invalid path'), workdir
+    width = max(len(label) for label, _ in fields) + 2
+    return [f'{label + ":":<{width}}{value}' for label, value in fields], workdir
+
+
+def __line_count(arguments: list[str]) -> tuple[int, list[str]] | None:
+    match arguments:
+        case ['-n', count, *path] if count.isdigit() and len(path) <= 1:
+            return int(count), path
+        case [*path] if len(path) <= 1 and not (path and path[0].startswith('-')):
+            return 10, path
+    return None
+
+
+def head(command: list[str], kernel, workdir: list, lines=None):
+    parsed = __line_count(command[1:])
+    if parsed is None:
+        return CommandError('USAGE: head [-n <lines>] [filename]'), workdir
+    count, path = parsed
+    if path:
+        lines = __file_lines('head', kernel, __resolve(kernel, workdir, path[0]))
+        if isinstance(lines, CommandError):
+            return lines, workdir
+    elif lines is None:
+        return CommandError('head: reads from a file or a pipe, e.g. cat <filename> | head'), workdir
+    return itertools.islice(lines, count), workdir
+
+
+def tail(command: list[str], kernel, workdir: list, lines=None):
+    parsed = __line_count(command[1:])
+    if parsed is None:
+        return CommandError('USAGE: tail [-n <lines>] [filename]'), workdir
+    count, path = parsed
+    if path:
+        return __tail_lines('tail', kernel, __resolve(kernel, workdir, path[0]), count), workdir
+    if lines is None:
+        return CommandError('tail: reads from a file or a pipe, e.g. cat <filename> | tail'), workdir
+    return list(collections.deque(lines, maxlen=count)), workdir
+
+
+def cat_filter(command: list[str], kernel, workdir: list, lines):
+    if len(command) > 1:
+        return cat(command, kernel, workdir)
+    return lines, workdir
+
+
+def grep_filter(command: list[str], kernel, workdir: list, lines):
+    arguments = command[1:]
+    flags, invert = 0, False
+    while len(arguments) > 1 and arguments[0] in ('-i', '-v'):
+        if arguments.pop(0) == '-i':
+            flags |= re.IGNORECASE
+        else:
+            invert = True
+    if len(arguments) != 1:
+        return CommandError('USAGE: ... | grep [-i] [-v] <pattern>'), workdir
+    try:
+        regex = re.compile(arguments[0], flags)
+    except re.error as error:
+        return CommandError(f'grep: Invalid pattern: {error}'), workdir
+    return (line for line in lines if (regex.search(line) is None) == invert), workdir
+
+
+def wc(command: list[str], kernel, workdir: list, lines=None):
+    match command[1:]:
+        case ['-l']:
+            count_lines = True
+        case []:
+            count_lines = False
+        case _:
+            return CommandError('USAGE: ... | wc [-l]'), workdir
+    if lines is None:
+        return CommandError('wc: reads from a pipe, e.g. cat <filename> | wc'), workdir
+    line_count = word_count = char_count = 0
+    for line in lines:
+        line_count += 1
+        word_count += len(line.split())
+        char_count += len(line) + 1
+    return str(line_count) if count_lines else f'{line_count} {word_count} {char_count}', workdir
+
+
+def sort(command: list[str], kernel, workdir: list, lines=None):
+    match command[1:]:
+        case ['-r']:
+            reverse = True
+        case []:
+            reverse = False
+        case _:
+            return CommandError('USAGE: ... | sort [-r]'), workdir
+    if lines is None:
+        return CommandError('sort: reads from a pipe, e.g. cat <filename> | sort'), workdir
+    return sorted(lines, reverse=reverse), workdir
+
+
+def __resolve(kernel: Kernel, workdir: list, path: str) -> list:
+    return kernel.parse_path(path) if path.startswith('/') else workdir + kernel.parse_path(path)
+
+
+def __display(path: tuple) -> str:
+    return '/' + '/'.join(path)
+
+
+def find(command: list[str], kernel: Kernel, workdir: list):
+    arguments = command[1:]
+    start = workdir
+    if arguments and not arguments[0].startswith('-'):
+        start = __resolve(kernel, workdir, arguments.pop(0))
+    name_pattern, entry_type = None, None
+    while arguments:
+        match arguments:
+            case ['-name', pattern, *arguments]:
+                name_pattern = pattern
+            case ['-type', 'f' | 'd' as entry_type, *arguments]:
+                pass
+            case _:
+                return CommandError('USAGE: find [path] [-name <pattern>] [-type f|d]'), workdir
+    try:
+        walk = kernel.walk(start)
+        first = next(walk)
+    except ValueError:
+        return CommandError('find: Invalid path'), workdir
+    return __find_lines(__chain(first, walk), name_pattern, entry_type), workdir
+
+
+def __find_lines(walk, name_pattern: str | None, entry_type: str | None):
+    for path, entry in walk:
+        if entry_type is not None and entry.is_dir() != (entry_type == 'd'):
+            continue
+        if name_pattern is not None and not fnmatchcase(entry.name, name_pattern):
+            continue
+        yield __display(path)
+
+
+def grep(command: list[str], kernel: Kernel, workdir: list):
+    arguments = command[1:]
+    recursive, flags, workers = False, 0, src.variant_options.grep_workers
+    usage = CommandError('USAGE: grep [-r] [-i] [-j <workers>] <pattern> [path]')
+    while arguments and arguments[0].startswith('-') and len(arguments) > 1:
+        match arguments:
+            case ['-r', *rest]:
+                recursive = True
+            case ['-i', *rest]:
+                flags |= re.IGNORECASE
+            case ['-j', jobs, *rest]:
+                if not (jobs.isdigit() and int(jobs) > 0):
+                    return usage, workdir
+                workers = int(jobs)
+            case _:
+                break
+        arguments = rest
+    if not arguments or len(arguments) > 2:
+        return usage, workdir
+    try:
+        re.compile(arguments[0], flags)
+    except re.error as error:
+        return CommandError(f'grep: Invalid pattern: {error}'), workdir
+    start = __resolve(kernel, workdir, arguments[1]) if len(arguments) == 2 else workdir
+    try:
+        walk = kernel.walk(start)
+        first = next(walk)
     except ValueError:
-        return 'Invalid filename', workdir
+        return CommandError('grep: Invalid path'), workdir
+    if first[1].is_dir() and not recursive:
+        return CommandError(f'grep: {__display(first[0])}: Is a directory'), workdir
+    files = ((path, entry) for path, entry in __chain(first, walk) if not entry.is_dir())
+    return __grep_lines(arguments[0], flags, files, workers), workdir
+
+
+def __chain(first, rest):
+    yield first
+    yield from rest
+
+
+def __grep_file(path: tuple, entry) -> tuple[str, str | None]:
+    return __display(path), entry.node.content if entry.readable else None
+
+
+def __grep_batch(pattern: str, flags: int, batch: list[tuple]) -> list[str]:
+    regex = re.compile(pattern, flags)
+    lines = []
+    for path, entry in batch:
+        path, content = __grep_file(path, entry)
+        if content is None:
+            lines.append(f'grep: {path}: Access denied')
+            continue
+        lines.extend(f'{path}:{line}' for line in content.split('\n') if regex.search(line))
+    return lines
+
+
+def __grep_lines(pattern: str, flags: int, files, workers: int | None):
+    scanned = 0
+    for path, entry in files:
+        yield from __grep_batch(pattern, flags, [(path, entry)])
+        scanned += 1
+        if scanned >= src.variant_options.grep_parallel_threshold and workers != 1:
+            break
     else:
-        return file.content if file.content != -1 else 'cat: Access denied', workdir
+        return
+    batch_size = src.variant_options.grep_batch_files
+    workers = workers or os.cpu_count()
+    # threads share the tree, workers read their batch's contents in place instead of receiving pickled copies
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = collections.deque()
+        batch = []
+        for path, entry in files:
+            batch.append((path, entry))
+            if len(batch) < batch_size:
+                continue
+            in_flight.append(pool.submit(__grep_batch, pattern, flags, batch))
+            batch = []
+            if len(in_flight) > workers * 2:
+                yield from in_flight.popleft().result()
+        if batch:
+            in_flight.append(pool.submit(__grep_batch, pattern, flags, batch))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def du(command: list[str], kernel: Kernel, workdir: list):
+    arguments = command[1:]
+    summary = '-s' in arguments
+    arguments = [argument for argument in arguments if argument != '-s']
+    if len(arguments) > 1:
+        return CommandError('USAGE: du [-s] [path]'), workdir
+    start = __resolve(kernel, workdir, arguments[0]) if arguments else workdir
+    try:
+        walk = kernel.walk(start)
+        first = next(walk)
+    except ValueError:
+        return CommandError('du: Invalid path'), workdir
+    return __du_lines(__chain(first, walk), summary), workdir
+
+
+def __du_lines(walk, summary: bool):
+    totals: list[list] = []
+    for path, entry in walk:
+        while totals and path[:len(totals[-1][0])] != totals[-1][0]:
+            yield from __du_close(totals, summary)
+        if entry.is_dir():
+            totals.append([path, 0])
+        elif totals:
+            totals[-1][1] += entry.node.size
+        else:
+            yield f'{entry.node.size}\t{__display(path)}'
+    while totals:
+        yield from __du_close(totals, summary)
+
+
+def __du_close(totals: list[list], summary: bool):
+    path, size = totals.pop()
+    if totals:
+        totals[-1][1] += size
+    if not summary or not totals:
+        yield f'{size}\t{__display(path)}'
+
+
+def stats(command: list[str], kernel: Kernel, workdir: list):
+    if not kernel.metrics.enabled:
+        return CommandError('stats: metrics are disabled'), workdir
+    match command[1:]:
+        case []:
+            return kernel.metrics.report(), workdir
+        case ['reset']:
+            kernel.metrics.reset()
+            return None, workdir
+        case ['-p']:
+            return kernel.metrics.prometheus().rstrip('\n'), workdir
+        case ['-w']:
+            # the dump goes only to the configured file, sessions can't pick paths on the host
+            if kernel.username != 'root':
+                return CommandError('stats: Access denied'), workdir
+            if not src.variant_options.metrics_path:
+                return CommandError('stats: metrics_path is not configured'), workdir
+            try:
+                kernel.metrics.write_prometheus(src.variant_options.metrics_path)
+            except OSError as error:
+                return CommandError(f'stats: {error}'), workdir
+            return None, workdir
+    return CommandError('USAGE: stats [reset | -p | -w]'), workdir
 
 
 def touch(command: list[str], kernel: Kernel, workdir: list):
     if len(command) == 1:
-        return 'USAGE: touch <filename>', workdir
+        return CommandError('USAGE: touch <filename>'), workdir
     try:
         kernel.create_file(workdir, command[1], 640, '')
     except ValueError:
-        return 'touch: File already exists', workdir
+        return CommandError('touch: File already exists'), workdir
     return None, workdir
 
 
 def rm(command: list[str], kernel: Kernel, workdir: list):
     if len(command) == 1:
-        return 'USAGE: rm <filename>', workdir
+        return CommandError('USAGE: rm <filename>'), workdir
     try:
         kernel.remove_file(workdir + [command[1]])
     except ValueError:
-        return 'rm: File does not exists', workdir
+        return CommandError('rm: File does not exists'), workdir
     except Exception:
-        return 'rm: Access denied', workdir
+        return CommandError('rm: Access denied'), workdir
     return None, workdir
 
 
 def useradd(command: list[str], kernel: Kernel, workdir: list):
     if len(command) == 1:
-        return 'USAGE: useradd <username>', workdir
+        return CommandError('USAGE: useradd <username>'), workdir
     try:
         kernel.create_user(command[1])
     except ValueError:
-        return 'useradd: User already exists', workdir
+        return CommandError('useradd: User already exists'), workdir
     except Exception:
-        return 'useradd: Access denied', workdir
+        return CommandError('useradd: Access denied'), workdir
     return None, workdir
 
 
 def passwd(command: list[str], kernel: Kernel, workdir: list):
     if len(command) == 1:
-        return 'USAGE: passwd <username>', workdir
+        return CommandError('USAGE: passwd <username>'), workdir
     password_match = False
     while not password_match:
         password1 = getpass("Enter new password ")
@@ -124,7 +487,7 @@ def passwd(command: list[str], kernel: Kernel, workdir: list):
     try:
         kernel.change_user_password(command[1], password1)
     except ValueError as error:
-        return 'passwd: ' + str(error), workdir
+        return CommandError('passwd: ' + str(error)), workdir
     # except Exception:
     #     return 'passwd: Access denied', workdir
     return None, workdir
@@ -132,7 +495,7 @@ def passwd(command: list[str], kernel: Kernel, workdir: list):
 
 def usermod(command: list[str], kernel: Kernel, workdir: list):
     if len(command) < 4:
-        return 'USAGE: usermod <flag> <group> <username>', workdir
+        return CommandError('USAGE: usermod <flag> <group> <username>'), workdir
     try:
         # -a append
         if command[1] == "-a":
@@ -141,12 +504,130 @@ def usermod(command: list[str], kernel: Kernel, workdir: list):
         if command[1] == "-r":
             kernel.remove_user_group(username=command[3], group=command[2])
     except ValueError as error:
-        return 'usermod: ' + str(error), workdir
+        return CommandError('usermod: ' + str(error)), workdir
+    except Exception:
+        return CommandError('usermod: Access denied'), workdir
+    return None, workdir
+
+
+def userimport(command: list[str], kernel: Kernel, workdir: list):
+    match command[1:]:
+        case ['--strict', path]:
+            strict = True
+        case [path]:
+            strict = False
+        case _:
+            return CommandError('USAGE: userimport [--strict] <users.csv | users.jsonl>'), workdir
+    if kernel.username != 'root':
+        return CommandError('userimport: Access denied'), workdir
+    try:
+        # records come from a file inside the partition, reading host paths is left to python -m src.provisioning
+        records = io.StringIO(''.join(kernel.iter_read(__resolve(kernel, workdir, path))), newline='')
+        report = import_users(kernel, parse_records(path, records), strict=strict)
+    except ValueError as error:
+        return CommandError('userimport: ' + str(error)), workdir
+    except Exception:
+        return CommandError('userimport: Access denied'), workdir
+    lines = list(report.lines())
+    return (CommandError('\n'.join(lines)) if report.errors else lines[-1]), workdir
+
+
+def begin(command: list[str], kernel: Kernel, workdir: list):
+    try:
+        kernel.begin()
+    except ValueError as error:
+        return CommandError('begin: ' + str(error)), workdir
+    return None, workdir
+
+
+def commit(command: list[str], kernel: Kernel, workdir: list):
+    try:
+        kernel.commit()
+    except ValueError as error:
+        return CommandError('commit: ' + str(error)), workdir
+    return None, workdir
+
+
+def rollback(command: list[str], kernel: Kernel, workdir: list):
+    try:
+        kernel.rollback()
+    except ValueError as error:
+        return CommandError('rollback: ' + str(error)), workdir
+    return None, workdir
+
+
+def getfacl(command: list[str], kernel: Kernel, workdir: list):
+    if len(command) != 2:
+        return CommandError('USAGE: getfacl <filename>'), workdir
+    path = __resolve(kernel, workdir, command[1])
+    try:
+        file = kernel.read(path)
+        if isinstance(file, Directory):
+            return CommandError('getfacl: ACLs are kept only on files'), workdir
+        entries = kernel.get_acl(path)
+    except ValueError:
+        return CommandError('getfacl: Invalid filename'), workdir
+    mode = file.permissions_str
+    return [f'# file: {__display(tuple(path))}', f'# owner: {file.owner}', f'# group: {file.group}',
+            f'user::{mode[:3]}', *(entry for entry in entries if entry.startswith('user:')),
+            f'group::{mode[3:6]}', *(entry for entry in entries if entry.startswith('group:')),
+            f'other::{mode[6:]}'], workdir
+
+
+def setfacl(command: list[str], kernel: Kernel, workdir: list):
+    match command[1:]:
+        case ['-b', path]:
+            changes = None
+        case ['-m' | '-x' as flag, spec, path]:
+            changes = spec.split(',')
+        case _:
+            return CommandError('USAGE: setfacl -m <u|g:name:rwx>[,...] | -x <u|g:name>[,...] | -b <filename>'), \
+                workdir
+    path = __resolve(kernel, workdir, path)
+    try:
+        entries = {}
+        if changes is not None:
+            for entry in kernel.get_acl(path):
+                kind, name, perms = parse_entry(entry)
+                entries[kind, name] = perms
+            for change in changes:
+                kind, name, perms = parse_entry(change)
+                if flag == '-x':
+                    entries.pop((kind, name), None)
+                elif perms is None:
+                    raise ValueError(f'Missing ACL permissions: {change}')
+                else:
+                    entries[kind, name] = perms
+        kernel.set_acl(path, [f'{kind}:{name}:{perms}' for (kind, name), perms in entries.items()])
+    except ValueError as error:
+        return CommandError('setfacl: ' + str(error)), workdir
     except Exception:
-        return 'usermod: Access denied', workdir
+        return CommandError('setfacl: Access denied'), workdir
     return None, workdir
 
 
+def snapshot(command: list[str], kernel: Kernel, workdir: list):
+    try:
+        match command[1:]:
+            case ['create', *name] if len(name) <= 1:
+                checkpoint = kernel.create_snapshot(*name)
+                return f'Snapshot {checkpoint.name} created', workdir
+            case ['list']:
+                return (f'{checkpoint.name}\t{checkpoint.created}'.expandtabs(24)
+                        for checkpoint in kernel.snapshots.values()), workdir
+            case ['restore', name]:
+                kernel.restore_snapshot(name)
+                return None, workdir
+            case ['diff', name, *other] if len(other) <= 1:
+                return kernel.diff_snapshot(name, *other), workdir
+    except ValueError as error:
+        return CommandError('snapshot: ' + str(error)), workdir
+    except Exception:
+        return CommandError('snapshot: Access denied'), workdir
+    return CommandError('USAGE: snapshot create [name] | list | restore <name> | diff <name> [name]\n'
+                        'Snapshots are kept in memory and are lost when the partition is closed'), workdir
+
+
 commands = {
     'echo': echo,
     'ls': ls,
@@ -156,5 +637,30 @@ commands = {
     'touch': touch,
     'useradd': useradd,
     'passwd': passwd,
-    'usermod': usermod
+    'usermod': usermod,
+    'userimport': userimport,
+    'begin': begin,
+    'commit': commit,
+    'rollback': rollback,
+    'find': find,
+    'grep': grep,
+    'du': du,
+    'stats': stats,
+    'snapshot': snapshot,
+    'getfacl': getfacl,
+    'setfacl': setfacl,
+    'wc': wc,
+    'sort': sort,
+    'head': head,
+    'tail': tail,
+    'stat': stat
+}
+
+filters = {
+    'cat': cat_filter,
+    'grep': grep_filter,
+    'wc': wc,
+    'sort': sort,
+    'head': head,
+    'tail': tail
 }
@@ -0,0 +1,80 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Challenge:
+    __slots__ = ('username', 'prompt', 'expected', 'numeric', 'attempts_left', 'expires_at')
+
+    def __init__(self, username: str, prompt: str, expected: str | float, numeric: bool, attempts: int,
+                 timeout: float):
+        self.username: str = username
+        self.prompt: str = prompt
+        self.expected: str | float = expected
+        self.numeric: bool = numeric
+        self.attempts_left: int = attempts
+        self.expires_at: float = time.monotonic() + timeout
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    @property
+    def exhausted(self) -> bool:
+        return self.attempts_left <= 0 or self.expired
+
+    def check(self, answer: str) -> bool:
+        if self.exhausted:
+            return False
+        self.attempts_left -= 1
+        if self.numeric:
+            try:
+                return float(answer) == self.expected
+            except ValueError:
+                return False
+        return answer == self.expected
+
+
+class ConfirmationScheduler:
+    def __init__(self):
+        self.heap: list[tuple[float, int, object]] = []
+        self.deadlines: dict[object, float] = {}
+        self.counter = itertools.count()
+        # sessions schedule from worker threads while the waiter pops, the condition guards the heap and wakes it
+        self.condition = threading.Condition()
+
+    def schedule(self, session, delay: float):
+        deadline = time.monotonic() + delay
+        with self.condition:
+            self.deadlines[session] = deadline
+            heapq.heappush(self.heap, (deadline, next(self.counter), session))
+            self.condition.notify_all()
+
+    def cancel(self, session):
+        with self.condition:
+            self.deadlines.pop(session, None)
+
+    def next_deadline(self) -> float | None:
+        with self.condition:
+            while self.heap and self.deadlines.get(self.heap[0][2]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float = None) -> list:
+        now = time.monotonic() if now is None else now
+        due = []
+        with self.condition:
+            while (deadline := self.next_deadline()) is not None and deadline <= now:
+                _, _, session = heapq.heappop(self.heap)
+                del self.deadlines[session]
+                due.append(session)
+        return due
+
+    def wait(self, timeout: float):
+        with self.condition:
+            deadline = self.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+            if timeout > 0:
+                self.condition.wait(timeout)
@@ -0,0 +1,27 @@
+import argparse
+import os
+
+from src.binary_storage import BinaryStorage, is_binary_partition
+from src.kernel import Kernel
+from src.storage import JsonStorage
+
+
+def convert(source_path: str, target_path: str):
+    kernel = Kernel(source_path, 'root', ['root'], journal=os.path.exists(source_path + '.journal'))
+    try:
+        target = JsonStorage(target_path) if is_binary_partition(source_path) else BinaryStorage(target_path)
+        target.write(target.encode(kernel.partition, kernel.root, kernel.names))
+    finally:
+        kernel.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a partition between the JSON and binary formats')
+    parser.add_argument('source')
+    parser.add_argument('target')
+    arguments = parser.parse_args()
+    convert(arguments.source, arguments.target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import hashlib
+import hmac
+import os
+import threading
+
+import src.variant_options
+
+ALGORITHM = 'pbkdf2_sha256'
+
+
+def hash_password(password: str, iterations: int = None, salt: bytes = None) -> str:
+    iterations = iterations or src.variant_options.password_hash_iterations
+    salt = salt or os.urandom(src.variant_options.password_salt_bytes)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f'{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}'
+
+
+def check_password_policy(password: str):
+    password_min_length = src.variant_options.password_length
+    should_contain_letters = 1
+    should_contain_numbers = 0
+    if len(password) < password_min_length:
+        raise ValueError("Password should contain at least {} characters".format(password_min_length))
+    if should_contain_numbers and not any(char.isdigit() for char in password):
+        raise ValueError("Password should contain numbers")
+    if should_contain_letters and not any(char.isalpha() for char in password):
+        raise ValueError("Password should contain letters")
+
+
+def is_hashed(encoded: str | None) -> bool:
+    return isinstance(encoded, str) and encoded.startswith(ALGORITHM + '$')
+
+
+def check_password(password: str, encoded: str) -> bool:
+    algorithm, iterations, salt, digest = encoded.split('$')
+    if algorithm != ALGORITHM:
+        return False
+    candidate = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+
+def needs_rehash(encoded: str) -> bool:
+    return int(encoded.split('$')[1]) < src.variant_options.password_hash_iterations
+
+
+class CredentialCache:
+    def __init__(self):
+        self.key: bytes = os.urandom(32)
+        self.verified: dict[str, tuple[str, bytes]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock = threading.Lock()
+
+    def __token(self, password: str) -> bytes:
+        return hmac.digest(self.key, password.encode('utf-8'), 'sha256')
+
+    def verify(self, username: str, password: str, encoded: str) -> bool:
+        token = self.__token(password)
+        with self.lock:
+            cached = self.verified.get(username)
+        if cached is not None and cached[0] == encoded:
+            if hmac.compare_digest(cached[1], token):
+                self.hits += 1
+                return True
+        self.misses += 1
+        if not check_password(password, encoded):
+            return False
+        self.remember(username, password, encoded)
+        return True
+
+    def remember(self, username: str, password: str, encoded: str):
+        with self.lock:
+            self.verified[username] = (encoded, self.__token(password))
+
+    def invalidate(self, username: str):
+        with self.lock:
+            self.verified.pop(username, None)
+
+    def clear(self):
+        with self.lock:
+            self.verified.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self.verified), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+
+
+class Journal:
+    def __init__(self, path: str, sync_batch: int, sync_interval: float):
+        self.path: str = path
+        self.sync_batch: int = sync_batch
+        self.sync_interval: float = sync_interval
+        self.pending: list[str] = []
+        self.unsynced: int = 0
+        self.last_sync: float = time.monotonic()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.compaction: threading.Thread | None = None
+        self.flusher: threading.Timer | None = None
+        self.lock = threading.RLock()
+
+    @property
+    def rotated_path(self) -> str:
+        return self.path + '.old'
+
+    @classmethod
+    def replay(cls, path: str):
+        for journal_path in (path + '.old', path):
+            if not os.path.exists(journal_path):
+                continue
+            with open(journal_path, encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write at the tail of the journal
+
+    def record(self, op: str, path: list[str], **args):
+        entry = json.dumps({'op': op, 'path': path, **args}, separators=(',', ':'))
+        with self.lock:
+            self.pending.append(entry)
+
+    def size(self) -> int:
+        with self.lock:
+            return os.fstat(self.file.fileno()).st_size
+
+    def commit(self, force: bool = False):
+        with self.lock:
+            if self.pending:
+                self.file.write('\n'.join(self.pending) + '\n')
+                self.file.flush()
+                self.unsynced += len(self.pending)
+                self.pending.clear()
+            if not self.unsynced:
+                return
+            if force or self.unsynced >= self.sync_batch or time.monotonic() - self.last_sync >= self.sync_interval:
+                self.__sync()
+            elif self.flusher is None:
+                # without further commits the records still reach the disk sync_interval after the first of them
+                self.flusher = threading.Timer(self.sync_interval, self.__sync_due)
+                self.flusher.daemon = True
+                self.flusher.start()
+
+    def __sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        if self.flusher is not None:
+            self.flusher.cancel()
+            self.flusher = None
+
+    def __sync_due(self):
+        with self.lock:
+            if self.flusher is not threading.current_thread():
+                return  # a commit synced the records first
+            self.flusher = None
+            if self.unsynced and not self.file.closed:
+                self.__sync()
+
+    @property
+    def compacting(self) -> bool:
+        return self.compaction is not None and self.compaction.is_alive()
+
+    def compact(self, snapshot, storage):
+        with self.lock:
+            self.commit(force=True)
+            self.file.close()
+            os.replace(self.path, self.rotated_path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.compaction = threading.Thread(target=self.__write_snapshot, args=(snapshot, storage), daemon=True)
+        self.compaction.start()
+
+    def __write_snapshot(self, snapshot, storage):
+        storage.write(snapshot, repoint=False)
+        os.remove(self.rotated_path)
+
+    def close(self):
+        self.commit(force=True)
+        if self.compaction is not None:
+            self.compaction.join()
+        self.file.close()
+
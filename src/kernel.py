@@ -1,39 +1,74 @@
-import json
+import copy
+import functools
+import os
 import datetime
+import hmac
 from getpass import getpass
 import random
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator
 
 import src.variant_options
+from src.journal import Journal
+from src.nodes import (NameTable, FileNode, DirNode, Acl, mode_from_permissions, permissions_from_mode, mode_to_str,
+                       text_size, node_from_dict, node_to_dict)
+from src.storage import JsonStorage, BlobStorage, Snapshot
+from src.binary_storage import BinaryStorage, BinarySnapshot, is_binary_partition
+from src.permission_cache import PermissionCache
+from src.open_files import FileHandle, MODES
+from src.mounts import MountTable, Mount, routed, partition_file
+from src.acl import GroupBits, effective_mask
+from src.users import UserDirectory, UserRecord
+from src.confirmation import Challenge
+from src.credentials import CredentialCache, hash_password, is_hashed, needs_rehash, check_password_policy
+from src.metrics import Metrics
+
+USERS_PATH = ('admin', 'users')
+
+
+def locked(method):
+    # tree mutations and serialization run under the kernel lock, disk syncs happen outside of it
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class File:
-    def __init__(self, filename: str, path: str, owner: str, group: str,
-                 permissions: int, content: str | bool, *args, **kwargs):
+    __slots__ = ('filename', 'path', 'node', 'names', 'denied')
+
+    def __init__(self, filename: str, path: str, node: FileNode, names: NameTable, denied: bool = False):
         self.filename: str = filename
         self.path: str = path
-        self.owner: str = owner
-        self.group: str = group
-        self.permissions: int = permissions
-        self.content: str | int = content
+        self.node: FileNode = node
+        self.names: NameTable = names
+        self.denied: bool = denied
+
+    @property
+    def owner(self) -> str:
+        return self.names.name(self.node.owner)
+
+    @property
+    def group(self) -> str:
+        return self.names.name(self.node.group)
+
+    @property
+    def permissions(self) -> int:
+        return permissions_from_mode(self.node.mode)
+
+    @property
+    def content(self) -> str | int:
+        return -1 if self.denied else self.node.content
+
+    @property
+    def size(self) -> int:
+        return self.node.size
 
     @property
     def permissions_str(self):
-        octal = str(self.permissions)
-        while len(octal) < 3:
-            octal = '0' + octal
-
-        if len(octal) > 3:
-            octal = octal[-3:]
-        result = ''
-        value_letters = [(4, 'r'), (2, 'w'), (1, 'x')]
-        for digit in [int(n) for n in str(octal)]:
-            for value, letter in value_letters:
-                if digit >= value:
-                    result += letter
-                    digit -= value
-                else:
-                    result += '-'
-        return result
+        return mode_to_str(self.node.mode)
 
     def __str__(self):
         return f'File {self.path}{"/" if self.path != "/" else ""}{self.filename}:\n' \
@@ -42,10 +77,6 @@ class File:
                f'---\n' \
                f'{self.content if self.content != -1 else "Access denied"}\n'
 
-    @classmethod
-    def from_dict(cls, filename: str, path: str, file: dict):
-        return cls(filename, path, **file)
-
 
 class Directory:
     def __init__(self, path: str):
@@ -59,183 +90,877 @@ class Directory:
         return f'Directory {self.path}'
 
 
+class DirEntry:
+    __slots__ = ('name', 'node', 'names', 'readable')
+
+    def __init__(self, name: str, node: FileNode | DirNode, names: NameTable, readable: bool):
+        self.name: str = name
+        self.node: FileNode | DirNode = node
+        self.names: NameTable = names
+        self.readable: bool = readable
+
+    def is_dir(self) -> bool:
+        return isinstance(self.node, DirNode)
+
+    @property
+    def owner(self) -> str:
+        return self.names.name(self.node.owner)
+
+    @property
+    def group(self) -> str:
+        return self.names.name(self.node.group)
+
+    @property
+    def permissions(self) -> int:
+        return permissions_from_mode(self.node.mode)
+
+    @property
+    def permissions_str(self) -> str:
+        return mode_to_str(self.node.mode)
+
+    @property
+    def size(self) -> int:
+        return self.node.size
+
+    @property
+    def content(self) -> str | int:
+        return self.node.content if self.readable else -1
+
+
+class DirListing:
+    __slots__ = ('node', 'names', 'check_permission')
+
+    def __init__(self, node: DirNode, names: NameTable, check_permission):
+        self.node: DirNode = node
+        self.names: NameTable = names
+        self.check_permission = check_permission
+
+    def __len__(self):
+        return len(self.node.children)
+
+    def __iter__(self) -> Iterator[DirEntry]:
+        for name, child in self.node.children.items():
+            yield DirEntry(name, child, self.names, self.check_permission(child))
+
+
+class Checkpoint:
+    __slots__ = ('name', 'root', 'partition', 'epoch', 'created')
+
+    def __init__(self, name: str, root: DirNode, partition: dict, epoch: int):
+        self.name: str = name
+        self.root: DirNode = root
+        self.partition: dict = partition
+        self.epoch: int = epoch
+        self.created: datetime.datetime = datetime.datetime.now().replace(microsecond=0)
+
+
 class Kernel:
 
-    def __init__(self, partition_path: str, username: str, groups: list[str]):
-        self.username: str = username
-        self.groups: list[str] = groups
+    def __init__(self, partition_path: str, username: str, groups: list[str], journal: bool = False,
+                 lazy: bool = False, blobs: bool = False):
+        self.identity = threading.local()
+        self.lock = threading.RLock()
+        self.default_identity: tuple[str, list[str]] = (username, groups)
         self.partition_path: str = partition_path
-        with open(partition_path) as partition_json:
-            self.partition: dict = json.load(partition_json)
+        self.storage: JsonStorage | BinaryStorage
+        if is_binary_partition(partition_path):
+            self.storage = BinaryStorage(partition_path)
+        else:
+            self.storage = BlobStorage(partition_path) if blobs else JsonStorage(partition_path, lazy)
+        self.journal: Journal | None = None
+        self.transaction: list[tuple] | None = None
+        self.transaction_journal_mark: int = 0
+        self.permission_cache: PermissionCache = PermissionCache(src.variant_options.permission_cache_size)
+        self.credentials: CredentialCache = CredentialCache()
+        self.metrics: Metrics = Metrics(src.variant_options.metrics_enabled)
+        self.metrics.register('permission_cache', self.permission_cache.stats)
+        self.metrics.register('credential_cache', self.credentials.stats)
+        self.epoch: int = 0
+        self.snapshots: dict[str, Checkpoint] = {}
+        self.open_files: dict[FileNode, set[FileHandle]] = {}
+        self.open_count: int = 0
+        self.mount_options: dict = {'journal': journal, 'lazy': lazy, 'blobs': blobs}
+        self.mounts: MountTable = MountTable(self.__load_mount)
+        self.prefix: tuple = ()
+        self.__load()
+        if journal:
+            self.__open_journal()
+
+    @property
+    def username(self) -> str:
+        return getattr(self.identity, 'username', self.default_identity[0])
+
+    @username.setter
+    def username(self, username: str):
+        self.identity.username = username
+
+    @property
+    def groups(self) -> list[str]:
+        return getattr(self.identity, 'groups', self.default_identity[1])
+
+    @groups.setter
+    def groups(self, groups: list[str]):
+        self.identity.groups = groups
+
+    @contextmanager
+    def as_user(self, username: str, groups: list[str]):
+        previous = self.identity.__dict__.copy()
+        self.username, self.groups = username, groups
+        try:
+            yield self
+        finally:
+            self.identity.__dict__.clear()
+            self.identity.__dict__.update(previous)
+
+    @property
+    def journal_path(self) -> str:
+        return self.partition_path + '.journal'
+
+    def __load(self):
+        self.partition: dict
+        self.root: DirNode
+        self.names: NameTable
+        self.partition, self.root, self.names = self.storage.load()
+        self.shared_sections: set[str] = set()
+        self.group_bits: GroupBits = GroupBits(self.names)
+        self.__build_index()
+
+    def __build_index(self):
+        self.index: dict[tuple, FileNode | DirNode] = {}
+        self.__index_subtree((), self.root)
+        self.permission_cache.clear()
+        open_files, self.open_files = self.open_files, {}
+        for handles in open_files.values():
+            for handle in handles:
+                handle.stale = True
+        self.mounts.reset(self.partition.get('mounts', {}), os.path.dirname(self.partition_path))
+        self.users: UserDirectory = UserDirectory()
+        users = self.index.get(USERS_PATH)
+        if isinstance(users, DirNode):
+            for name, node in users.children.items():
+                if isinstance(node, FileNode):
+                    self.users.update(name, node.content)
+
+    def __index_subtree(self, path: tuple, node: FileNode | DirNode):
+        self.index[path] = node
+        if isinstance(node, DirNode):
+            for name, child in node.children.items():
+                self.__index_subtree(path + (name,), child)
+
+    def __drop_subtree(self, path: tuple, node: FileNode | DirNode):
+        self.index.pop(path, None)
+        if isinstance(node, DirNode):
+            for name, child in node.children.items():
+                self.__drop_subtree(path + (name,), child)
+        else:
+            if path[:-1] == USERS_PATH:
+                self.users.remove(path[-1])
+            if node.epoch == self.epoch:
+                self.storage.release_content(node.data)
+            self.__invalidate(node)
+
+    def __restore_subtree(self, path: tuple, node: FileNode | DirNode):
+        self.index[path] = node
+        if isinstance(node, DirNode):
+            for name, child in node.children.items():
+                self.__restore_subtree(path + (name,), child)
+        else:
+            if node.epoch == self.epoch:
+                self.storage.retain_content(node.data)
+            if path[:-1] == USERS_PATH:
+                self.users.update(path[-1], node.content)
+
+    def __own(self, path: str | list | tuple, node: FileNode | DirNode = None) -> FileNode | DirNode:
+        # nodes older than the current epoch are shared with a snapshot, copy the path down to the node first
+        if node is not None and node.epoch == self.epoch:
+            return node
+        path = tuple(self.parse_path(path))
+        node = self.root
+        if node.epoch != self.epoch:
+            node = self.root = self.index[()] = node.copy(self.epoch)
+        for i in range(len(path)):
+            child = node.children[path[i]]
+            if child.epoch != self.epoch:
+                shared, child = child, child.copy(self.epoch)
+                node.children[path[i]] = self.index[path[:i + 1]] = child
+                if isinstance(child, FileNode):
+                    self.storage.retain_content(child.data)
+                    self.__retarget_handles(shared, child)
+            node = child
+        return node
+
+    def __retarget_handles(self, node: FileNode, copy: FileNode):
+        handles = self.open_files.pop(node, None)
+        if handles:
+            for handle in handles:
+                handle.node = copy
+            self.open_files[copy] = handles
+
+    def __invalidate(self, node: FileNode | DirNode):
+        self.permission_cache.invalidate_node(node)
+        for handle in self.open_files.pop(node, ()):
+            handle.stale = True
+
+    def __release_owned(self, node: FileNode | DirNode):
+        if node.epoch != self.epoch:
+            return
+        if isinstance(node, DirNode):
+            for child in node.children.values():
+                self.__release_owned(child)
+        else:
+            self.storage.release_content(node.data)
+
+    @locked
+    def create_snapshot(self, name: str = None) -> Checkpoint:
+        if self.username != 'root':
+            raise Exception('Access denied')
+        if self.transaction is not None:
+            raise ValueError('Cannot create a snapshot inside a transaction')
+        self.__check_unmounted()
+        if name is None:
+            name = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        if name in self.snapshots:
+            raise ValueError('Snapshot already exists')
+        checkpoint = Checkpoint(name, self.root, self.partition, self.epoch)
+        self.partition = dict(self.partition)
+        self.shared_sections = set(self.partition)
+        self.snapshots[name] = checkpoint
+        self.epoch += 1
+        return checkpoint
+
+    def __own_section(self, key: str) -> dict:
+        # like the nodes of the tree, sections of the partition dict are shared with snapshots until the first write
+        if key in self.shared_sections or key not in self.partition:
+            self.partition[key] = dict(self.partition.get(key, {}))
+            self.shared_sections.discard(key)
+        return self.partition[key]
+
+    def __check_unmounted(self):
+        # mounted partitions are separate kernels with their own trees, a checkpoint of this root can't cover them
+        if self.mounts.mounts:
+            raise ValueError('Snapshots are not supported while partitions are mounted')
+
+    def get_snapshot(self, name: str) -> Checkpoint:
+        try:
+            return self.snapshots[name]
+        except KeyError:
+            raise ValueError(f"Snapshot {name} don't exist")
+
+    @locked
+    def restore_snapshot(self, name: str):
+        if self.username != 'root':
+            raise Exception('Access denied')
+        if self.transaction is not None:
+            raise ValueError('Cannot restore a snapshot inside a transaction')
+        self.__check_unmounted()
+        checkpoint = self.get_snapshot(name)
+        self.__release_owned(self.root)
+        self.root = checkpoint.root
+        self.partition = dict(checkpoint.partition)
+        self.shared_sections = set(self.partition)
+        self.__build_index()
+        self.credentials.clear()
+        self.storage.tree_changed([])
+        if self.journal:
+            # a restore can't be expressed as journal entries, rotate the journal behind a full snapshot instead
+            if self.journal.compacting:
+                self.journal.compaction.join()
+            self.journal.compact(self.__serialize(), self.storage)
+        else:
+            self.storage.write(self.__serialize())
+
+    def diff_snapshot(self, name: str, other: str = None) -> Iterator[str]:
+        self.__check_unmounted()
+        old = self.get_snapshot(name).root
+        new = self.root if other is None else self.get_snapshot(other).root
+        return self.__diff((), old, new)
+
+    def __diff(self, path: tuple, old: FileNode | DirNode, new: FileNode | DirNode) -> Iterator[str]:
+        if old is new:
+            return
+        if isinstance(old, DirNode) and isinstance(new, DirNode):
+            for name, child in old.children.items():
+                if name in new.children:
+                    yield from self.__diff(path + (name,), child, new.children[name])
+                else:
+                    yield f'D /{"/".join(path + (name,))}'
+            for name in new.children.keys() - old.children.keys():
+                yield f'A /{"/".join(path + (name,))}'
+        elif isinstance(old, FileNode) and isinstance(new, FileNode):
+            if (old.owner, old.group, old.mode, old.acl) != (new.owner, new.group, new.mode, new.acl) or \
+                    old.data is not new.data and old.content != new.content:
+                yield f'M /{"/".join(path)}'
+        else:
+            yield f'M /{"/".join(path)}'
+
+    def __load_mount(self, mount: Mount) -> 'Kernel':
+        kernel = Kernel(mount.partition_path, *self.default_identity, **self.mount_options)
+        kernel.identity = self.identity
+        kernel.metrics = self.metrics
+        kernel.prefix = mount.path
+        if self.transaction is not None:
+            kernel.begin()
+        return kernel
+
+    @locked
+    def __mount(self, path: tuple, partition_path: str):
+        self.__own_section('mounts')['/' + '/'.join(path)] = partition_path
+        self.mounts.add(path, partition_file(os.path.dirname(self.partition_path), partition_path))
+        if self.journal:
+            self.journal.record('mount', list(path), partition=partition_path)
+
+    @locked
+    def __unmount(self, path: tuple):
+        mount = self.mounts.remove(path)
+        if mount.kernel is not None:
+            mount.kernel.close()
+        mounts = self.__own_section('mounts')
+        del mounts['/' + '/'.join(path)]
+        if not mounts:
+            del self.partition['mounts']
+        if self.journal:
+            self.journal.record('umount', list(path))
+
+    def __seed_partition(self, partition_path: str, entry: DirNode):
+        partition = {'metadata': copy.deepcopy(self.partition.get('metadata', {})), 'users': {}, 'filesystem': {}}
+        names = NameTable()
+        root = node_from_dict(node_to_dict(entry, self.names), names)
+        storage = BinaryStorage(partition_path) if partition_path.endswith('.sdsb') else JsonStorage(partition_path)
+        storage.write(storage.encode(partition, root, names))
+
+    @locked
+    def mount(self, path: str | list, partition_path: str):
+        if self.username != 'root':
+            raise Exception('Access denied')
+        if self.transaction is not None:
+            raise ValueError('Cannot mount inside a transaction')
+        path = tuple(self.parse_path(path))
+        mounted = self.partition.get('mounts', {}).get('/' + '/'.join(path))
+        if mounted == partition_path:
+            return
+        if mounted is not None:
+            raise ValueError('Mount point is busy')
+        if any(other[:len(path)] == path or path[:len(other)] == other for other in self.mounts.mounts):
+            raise ValueError('Nested mounts are not supported')
+        entry = self.__get_filesystem_entry(path)
+        if not path or not isinstance(entry, DirNode):
+            raise ValueError('Mount point must be a directory')
+        absolute_path = partition_file(os.path.dirname(self.partition_path), partition_path)
+        if absolute_path == os.path.realpath(self.partition_path):
+            raise ValueError('Cannot mount a partition into itself')
+        if not os.path.exists(absolute_path):
+            # a new partition takes over the directory's current content
+            self.__seed_partition(absolute_path, entry)
+            for name, child in list(entry.children.items()):
+                if isinstance(child, DirNode):
+                    self.__remove_directory(list(path), name)
+                else:
+                    self.__remove_file(list(path), name)
+        self.__mount(path, partition_path)
+        self.flush()
+
+    @locked
+    def umount(self, path: str | list):
+        if self.username != 'root':
+            raise Exception('Access denied')
+        if self.transaction is not None:
+            raise ValueError('Cannot unmount inside a transaction')
+        path = tuple(self.parse_path(path))
+        if path not in self.mounts.mounts:
+            raise ValueError(f'Not a mount point: /{"/".join(path)}')
+        kernel = self.mounts.mounts[path].kernel
+        if kernel is not None and kernel.open_count:
+            raise ValueError('Mount point is busy')
+        self.__unmount(path)
+        self.flush()
+
+    def __ancestors(self, path: str | list | tuple) -> list[DirNode]:
+        path = tuple(self.parse_path(path))
+        return [self.index[path[:i]] for i in range(len(path) + 1)]
+
+    def __remember(self, *undo):
+        if self.transaction is not None:
+            self.transaction.append(undo)
+
+    def __remember_link(self, path: tuple, name: str, entry: DirNode):
+        if self.transaction is not None:
+            self.transaction.append(('link', path, name, entry.children[name], list(entry.children).index(name)))
+
+    def begin(self):
+        if self.transaction is not None:
+            raise ValueError('Transaction already in progress')
+        self.transaction = []
+        self.transaction_journal_mark = len(self.journal.pending) if self.journal else 0
+        for kernel in self.mounts.loaded():
+            kernel.begin()
+
+    def commit(self):
+        if self.transaction is None:
+            raise ValueError('No transaction in progress')
+        self.transaction = None
+        self.flush()
+        for kernel in self.mounts.loaded():
+            kernel.commit()
+
+    @locked
+    def rollback(self):
+        if self.transaction is None:
+            raise ValueError('No transaction in progress')
+        for kernel in self.mounts.loaded():
+            kernel.rollback()
+        undo_log, self.transaction = self.transaction, None
+        for undo in reversed(undo_log):
+            match undo:
+                case ('unlink', path, name):
+                    self.__drop_subtree(path + (name,), self.index[path].children.pop(name))
+                    self.storage.tree_changed(self.__ancestors(path))
+                case ('link', path, name, node, position):
+                    children = self.index[path].children
+                    items = list(children.items())
+                    items.insert(position, (name, node))
+                    children.clear()
+                    children.update(items)
+                    self.__restore_subtree(path + (name,), node)
+                    self.storage.tree_changed(self.__ancestors(path))
+                case ('replace', path, name, node):
+                    children = self.index[path].children
+                    self.__drop_subtree(path + (name,), children[name])
+                    children[name] = node
+                    self.__restore_subtree(path + (name,), node)
+                    self.storage.tree_changed(self.__ancestors(path))
+                case ('mode', path, node, mode):
+                    node.mode = mode
+                    self.storage.node_changed(node, self.__ancestors(path[:-1]))
+                    self.__invalidate(node)
+                case ('acl', path, node, acl):
+                    node.acl = acl
+                    self.storage.node_changed(node, self.__ancestors(path[:-1]))
+                    self.__invalidate(node)
+                case ('credentials', username, credentials):
+                    self.__restore_credentials(username, credentials)
+                case ('data', path, node, data):
+                    current = node.data
+                    node.data = data
+                    self.storage.retain_content(data)
+                    self.storage.release_content(current)
+                    self.storage.node_changed(node, self.__ancestors(path[:-1]))
+                    if path[:-1] == USERS_PATH:
+                        self.users.update(path[-1], node.content)
+        if self.journal:
+            del self.journal.pending[self.transaction_journal_mark:]
+
+    @contextmanager
+    def transaction_scope(self):
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+
+    def __open_journal(self):
+        replayed = 0
+        for entry in Journal.replay(self.journal_path):
+            self.__apply_journal_entry(entry)
+            replayed += 1
+        if replayed:
+            self.storage.write(self.__serialize())
+            for path in (self.journal_path + '.old', self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.journal = Journal(self.journal_path, src.variant_options.journal_sync_batch,
+                               src.variant_options.journal_sync_interval)
+
+    def __apply_journal_entry(self, entry: dict):
+        path = entry['path']
+        try:
+            match entry['op']:
+                case 'mkdir':
+                    self.__create_directory(path[:-1], path[-1])
+                case 'rmdir':
+                    self.__remove_directory(path[:-1], path[-1])
+                case 'create':
+                    self.__create_file(path[:-1], path[-1], entry['owner'], entry['group'],
+                                       mode_from_permissions(entry['permissions']), entry['content'])
+                case 'rm':
+                    self.__remove_file(path[:-1], path[-1])
+                case 'chmod':
+                    self.__change_file_permissions(path, mode_from_permissions(entry['permissions']))
+                case 'write':
+                    self.__write(path, entry['content'])
+                case 'append':
+                    file = self.__get_filesystem_entry(path)
+                    if isinstance(file, FileNode) and file.size == entry['offset']:
+                        self.__append(path, entry['content'], file)
+                case 'setfacl':
+                    self.__set_acl(path, Acl.parse(entry['acl'], self.names))
+                case 'credentials':
+                    self.__set_credentials(path[-1], entry['credentials'])
+                case 'mount':
+                    if tuple(path) not in self.mounts.mounts:
+                        self.__mount(tuple(path), entry['partition'])
+                case 'umount':
+                    if tuple(path) in self.mounts.mounts:
+                        self.__unmount(tuple(path))
+        except (KeyError, ValueError):
+            pass  # replay is idempotent, entries already in the snapshot may no longer apply
 
     def set_user(self, username: str):
-        self.username: str = username
-        self.groups: list[str] = self.__get_user_data(username)["groups"]
+        self.permission_cache.invalidate_user(username)
+        self.username = username
+        self.groups = list(self.get_user(username).groups)
 
     @classmethod
     def parse_path(cls, path: str):
         if isinstance(path, list):
             return path
+        if isinstance(path, tuple):
+            return list(path)
         path = path.split('/')
         path = list(filter(None, path))  # Remove empty elements
         return path
 
-    def __get_filesystem_entry(self, path: str | list[str]) -> dict:
+    def __get_filesystem_entry(self, path: str | list[str]) -> FileNode | DirNode:
         if isinstance(path, str):
             path = self.parse_path(path)
-        entry = self.partition['filesystem']['root']['content']
+        if self.metrics.enabled:
+            self.metrics.count('path_lookups')
         try:
-            if len(path) == 0:
-                return self.partition['filesystem']['root']
-            if len(path) == 1:
-                return entry[path[0]]
-            for path_part in path[:-1]:
-                entry = entry[path_part]['content']
-            else:
-                entry = entry[path[-1]]
+            return self.index[tuple(path)]
         except KeyError:
-            raise ValueError(f'Invalid path: {"/"+"/".join(path)}')
-        return entry
+            raise ValueError(f'Invalid path: {"/"+"/".join((*self.prefix, *path))}')
 
-    def __get_file(self, path: str | list) -> File:
+    def __get_file(self, path: str | list, node: FileNode = None) -> File:
         if isinstance(path, str):
             path = self.parse_path(path)
-        file = self.__get_filesystem_entry(path)
-        return File.from_dict(path[-1], f'/{"/".join(path[:-1])}', file)
+        if node is None:
+            node = self.__get_filesystem_entry(path)
+        return File(path[-1], f'/{"/".join((*self.prefix, *path[:-1]))}', node, self.names)
 
     def __get_directory(self, path: str | list) -> Directory:
         if isinstance(path, str):
             path = self.parse_path(path)
-        return Directory(f'/{"/".join(path)}')
+        return Directory(f'/{"/".join((*self.prefix, *path))}')
 
+    @routed
     def get_directory_content(self, path: str | list) -> tuple[str]:
         entry = self.__get_filesystem_entry(path)
-        if entry['type'] == 'file':
+        if isinstance(entry, FileNode):
             raise ValueError(f'This is file')
-        return tuple(entry['content'].keys())
+        return tuple(entry.children.keys())
 
-    def __check_read_permission(self, path: str | list, username: str, groups: list[str]) -> bool:
+    @routed
+    def scandir(self, path: str | list) -> DirListing:
         entry = self.__get_filesystem_entry(path)
-        if entry['type'] == 'file':
-            match entry:
-                case entry if entry['owner'] == username:
-                    if entry['permissions'] // 100 > 4:
-                        return True
-                case entry if entry['group'] in groups:
-                    if entry['permissions'] // 10 % 10 > 4:
-                        return True
-                case entry:
-                    if entry['permissions'] % 10 > 4:
-                        return True
+        if isinstance(entry, FileNode):
+            raise ValueError(f'This is file')
+        username, groups = self.username, self.groups
+        return DirListing(entry, self.names, lambda node: self.__check_read_permission(node, username, groups))
+
+    @routed
+    def walk(self, path: str | list) -> Iterator[tuple[tuple, DirEntry]]:
+        path = tuple(self.parse_path(path))
+        yield from self.walk_from(self.prefix + path, self.__get_filesystem_entry(path))
+
+    def walk_from(self, path: tuple, entry: FileNode | DirNode,
+                  mounts: bool = True) -> Iterator[tuple[tuple, DirEntry]]:
+        username, groups = self.username, self.groups
+        if self.metrics.enabled:
+            self.metrics.count('tree_walks')
+        stack = [(path, entry)]
+        while stack:
+            path, entry = stack.pop()
+            if mounts and self.mounts.mounts and path in self.mounts.mounts:
+                yield from self.mounts.kernel(self.mounts.mounts[path]).walk(())
+                continue
+            if self.metrics.enabled:
+                self.metrics.count('walk_entries')
+            yield path, DirEntry(path[-1] if path else '', entry, self.names,
+                                 self.__check_read_permission(entry, username, groups))
+            if isinstance(entry, DirNode):
+                stack.extend((path + (name,), child) for name, child in reversed(entry.children.items()))
+
+    def can_read(self, entry: FileNode | DirNode, username: str = None, groups: list[str] = None) -> bool:
+        if username is None:
+            username, groups = self.username, self.groups
+        return self.__check_read_permission(entry, username, groups)
+
+    def __check_read_permission(self, entry: FileNode | DirNode, username: str, groups: list[str]) -> bool:
+        if isinstance(entry, FileNode):
+            return bool(self.permission_cache.mask(entry, username, self.group_bits(groups),
+                                                   self.__effective_mask) & 0o4)
         return False
 
-    def __check_write_permission(self, path: str | list, username: str, groups: list[str]) -> bool:
-        entry = self.__get_filesystem_entry(path)
-        if entry['type'] == 'file':
-            match entry:
-                case entry if entry['owner'] == username:
-                    if entry['permissions'] // 100 in [2, 3, 6, 7]:
-                        return True
-                case entry if entry['group'] in groups:
-                    if entry['permissions'] // 10 % 10 in [2, 3, 6, 7]:
-                        return True
-                case entry:
-                    if entry['permissions'] % 10 in [2, 3, 6, 7]:
-                        return True
+    def __check_write_permission(self, entry: FileNode | DirNode, username: str, groups: list[str]) -> bool:
+        if isinstance(entry, FileNode):
+            return bool(self.permission_cache.mask(entry, username, self.group_bits(groups),
+                                                   self.__effective_mask) & 0o2)
         return False
 
-    def __create_directory(self, path: str | list, name: str):
-        entry = self.__get_filesystem_entry(path)
-        entry['content'][name] = {'type': 'directory', 'content': {}}
+    def __effective_mask(self, entry: FileNode, username: str, group_bits: int) -> int:
+        return effective_mask(entry, self.names.ids.get(username), group_bits)
+
+    @locked
+    def __create_directory(self, path: str | list, name: str, entry: DirNode = None):
+        path = self.parse_path(path)
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        if name not in entry.children:
+            entry = self.__own(path, entry)
+            entry.children[name] = self.index[tuple(path) + (name,)] = DirNode(epoch=self.epoch)
+            self.__remember('unlink', tuple(path), name)
+            self.storage.tree_changed(self.__ancestors(path))
+        if self.journal:
+            self.journal.record('mkdir', path + [name])
 
+    @routed
     def create_directory(self, path: str | list, name: str):
         entry = self.__get_filesystem_entry(path)
-        if name in entry['content'].keys():
+        if name in entry.children.keys():
             raise ValueError('Directory already exists')
-        self.__create_directory(path, name)
+        self.__create_directory(path, name, entry)
         self.flush()
 
+    @locked
     def __remove_directory(self, path: str | list, name: str):
-        entry = self.__get_filesystem_entry(path)
-        del entry['content'][name]
+        path = self.parse_path(path)
+        entry = self.__own(path, self.__get_filesystem_entry(path))
+        self.__remember_link(tuple(path), name, entry)
+        node = entry.children.pop(name)
+        self.__drop_subtree(tuple(path) + (name,), node)
+        self.storage.tree_changed(self.__ancestors(path))
+        if self.journal:
+            self.journal.record('rmdir', path + [name])
 
+    @routed
     def remove_directory(self, path: str | list):
         if isinstance(path, str):
             path = self.parse_path(path)
+        if not path:
+            raise ValueError('Cannot remove a mount point' if self.prefix else 'Cannot remove the root directory')
         entry = self.__get_filesystem_entry(path)
-        if entry['content'].keys():
+        if entry.children.keys():
             raise ValueError('Directory is not empty')
         self.__remove_directory(path[:-1], path[-1])
         self.flush()
 
-    def __create_file(self, path: str | list, name: str, owner: str, group: str, permissions: int, content: str = ''):
-        entry = self.__get_filesystem_entry(path)
-        entry['content'][name] = {'type': 'file', 'owner': owner,
-                                  'group': group, 'permissions': permissions, 'content': content}
+    @locked
+    def __create_file(self, path: str | list, name: str, owner: str, group: str, mode: int, content: str = '',
+                      entry: DirNode = None):
+        path = self.parse_path(path)
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        entry = self.__own(path, entry)
+        if name in entry.children:
+            self.__drop_subtree(tuple(path) + (name,), entry.children[name])
+            self.__remember('replace', tuple(path), name, entry.children[name])
+        else:
+            self.__remember('unlink', tuple(path), name)
+        self.storage.tree_changed(self.__ancestors(path))
+        entry.children[name] = self.index[tuple(path) + (name,)] = FileNode(
+            self.names.intern(owner), self.names.intern(group), mode, self.storage.store_content(content), self.epoch)
+        if tuple(path) == USERS_PATH:
+            self.users.update(name, content)
+        if self.journal:
+            self.journal.record('create', path + [name], owner=owner, group=group,
+                                permissions=permissions_from_mode(mode), content=content)
 
+    @routed
     def create_file(self, path: str | list, name: str, permissions: int, content: str = ''):
         entry = self.__get_filesystem_entry(path)
-        if name in entry['content'].keys():
+        if name in entry.children.keys():
             raise ValueError('File already exists')
         if not (name and isinstance(permissions, int)):
             raise ValueError('Invalid file info provided')
-        self.__create_file(path, name, self.username, self.groups[0], permissions, content)
+        self.__create_file(path, name, self.username, self.groups[0], mode_from_permissions(permissions), content,
+                           entry)
         self.flush()
 
+    @locked
     def __remove_file(self, path: str | list, name: str):
-        entry = self.__get_filesystem_entry(path)
-        del entry['content'][name]
+        path = self.parse_path(path)
+        entry = self.__own(path, self.__get_filesystem_entry(path))
+        self.__remember_link(tuple(path), name, entry)
+        node = entry.children.pop(name)
+        self.__drop_subtree(tuple(path) + (name,), node)
+        self.storage.tree_changed(self.__ancestors(path))
+        if self.journal:
+            self.journal.record('rm', path + [name])
 
+    @routed
     def remove_file(self, path: str | list):
         if isinstance(path, str):
             path = self.parse_path(path)
-        if not self.__check_write_permission(path, self.username, self.groups):
+        if not path:
+            raise ValueError('Cannot remove a mount point' if self.prefix else 'Cannot remove the root directory')
+        if not self.__check_write_permission(self.__get_filesystem_entry(path), self.username, self.groups):
             raise Exception('Access denied')
         self.__remove_file(path[:-1], path[-1])
         self.flush()
 
-    def __change_file_permissions(self, path: str | list, permissions: int):
-        entry = self.__get_filesystem_entry(path)
-        entry['permissions'] = permissions
+    @locked
+    def __change_file_permissions(self, path: str | list, mode: int, entry: FileNode = None):
+        path = self.parse_path(path)
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        entry = self.__own(path, entry)
+        self.__remember('mode', tuple(path), entry, entry.mode)
+        entry.mode = mode
+        self.storage.node_changed(entry, self.__ancestors(path[:-1]))
+        self.__invalidate(entry)
+        if self.journal:
+            self.journal.record('chmod', path, permissions=permissions_from_mode(mode))
 
+    @routed
     def change_file_permissions(self, path: str | list, permissions: int):
         entry = self.__get_filesystem_entry(path)
-        if entry['owner'] != self.username:
+        if not isinstance(entry, FileNode) or self.names.name(entry.owner) != self.username:
             raise Exception('Access denied')
-        self.__change_file_permissions(path, permissions)
+        self.__change_file_permissions(path, mode_from_permissions(permissions), entry)
         self.flush()
 
-    def __write(self, path: str | list, content: str) -> None:
+    @locked
+    def __set_acl(self, path: str | list, acl: Acl | None, entry: FileNode = None):
+        path = self.parse_path(path)
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('ACLs can be set only on files')
+        entry = self.__own(path, entry)
+        self.__remember('acl', tuple(path), entry, entry.acl)
+        entry.acl = acl
+        self.storage.node_changed(entry, self.__ancestors(path[:-1]))
+        self.__invalidate(entry)
+        if self.journal:
+            self.journal.record('setfacl', path, acl=acl.entries(self.names) if acl is not None else [])
+
+    @routed
+    def get_acl(self, path: str | list) -> list[str]:
         entry = self.__get_filesystem_entry(path)
-        if entry['type'] != 'file':
+        if not isinstance(entry, FileNode):
+            raise ValueError('ACLs can be set only on files')
+        return entry.acl.entries(self.names) if entry.acl is not None else []
+
+    @routed
+    def set_acl(self, path: str | list, entries: list[str]):
+        entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode) or self.names.name(entry.owner) != self.username:
+            raise Exception('Access denied')
+        self.__set_acl(path, Acl.parse(entries, self.names), entry)
+        self.flush()
+
+    @locked
+    def __write(self, path: str | list, content: str, entry: FileNode = None) -> None:
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('You can write only to files')
+        entry = self.__own(path, entry)
+        previous = entry.data
+        entry.data = self.storage.store_content(content)
+        self.storage.release_content(previous)
+        path = self.parse_path(path)
+        self.storage.node_changed(entry, self.__ancestors(path[:-1]))
+        self.__remember('data', tuple(path), entry, previous)
+        if tuple(path[:-1]) == USERS_PATH:
+            self.users.update(path[-1], content)
+        if self.journal:
+            self.journal.record('write', path, content=content)
+
+    @locked
+    def __append(self, path: str | list, data: str, entry: FileNode = None) -> None:
+        if entry is None:
+            entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
             raise ValueError('You can write only to files')
-        entry['content'] = content
+        entry = self.__own(path, entry)
+        previous = entry.data
+        offset = entry.size if self.journal else 0
+        entry.data = self.storage.append_content(previous, data)
+        self.storage.release_content(previous)
+        path = self.parse_path(path)
+        self.storage.node_changed(entry, self.__ancestors(path[:-1]))
+        self.__remember('data', tuple(path), entry, previous)
+        if tuple(path[:-1]) == USERS_PATH:
+            self.users.update(path[-1], entry.content)
+        if self.journal:
+            # the offset makes replay skip appends already contained in the snapshot
+            self.journal.record('append', path, content=data, offset=offset)
 
+    @locked
     def update(self):
-        with open(self.partition_path) as partition_json:
-            self.partition: dict = json.load(partition_json)
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+            self.__load()
+            self.__open_journal()
+        else:
+            self.__load()
 
     def flush(self):
-        partition_json = json.dumps(self.partition, indent=4)
-        with open(self.partition_path, 'w') as partition_file:
-            partition_file.write(partition_json)
+        if self.transaction is not None:
+            return
+        if self.metrics.enabled:
+            self.metrics.count('flushes')
+        if self.journal:
+            if self.metrics.enabled and self.journal.pending:
+                self.metrics.count('journal_bytes', sum(map(len, self.journal.pending)) + len(self.journal.pending))
+            self.journal.commit()
+            if self.journal.size() >= src.variant_options.journal_compaction_size and not self.journal.compacting:
+                with self.lock:
+                    if not self.journal.compacting:
+                        self.journal.compact(self.__serialize(), self.storage)
+            return
+        with self.lock:
+            self.storage.write(self.__serialize())
+
+    @locked
+    def __serialize(self) -> Snapshot | BinarySnapshot:
+        snapshot = self.storage.encode(self.partition, self.root, self.names)
+        if self.metrics.enabled:
+            self.metrics.count('snapshots')
+            self.metrics.count('bytes_serialized', snapshot.size)
+        return snapshot
 
+    def close(self):
+        self.mounts.close()
+        if self.journal:
+            self.journal.close()
+        self.storage.close()
+        if self.metrics.enabled and src.variant_options.metrics_path:
+            self.metrics.write_prometheus(src.variant_options.metrics_path)
+
+    @routed
     def read(self, path: str | list) -> File | Directory:
         entry = self.__get_filesystem_entry(path)
-        if entry['type'] == 'file':
-            file: File = self.__get_file(path)
-            if not self.__check_read_permission(path, self.username, self.groups):
-                file.content = -1
+        if isinstance(entry, FileNode):
+            file: File = self.__get_file(path, entry)
+            file.denied = not self.__check_read_permission(entry, self.username, self.groups)
             return file
-        elif entry['type'] == 'directory':
-            return self.__get_directory(path)
+        return self.__get_directory(path)
 
+    def __get_readable_file(self, path: str | list) -> FileNode:
+        entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('You can read only files')
+        if not self.__check_read_permission(entry, self.username, self.groups):
+            raise Exception('Access denied')
+        return entry
+
+    @routed
+    def read_range(self, path: str | list, offset: int, length: int) -> bytes:
+        return self.__get_readable_file(path).read_range(offset, length)
+
+    @routed
+    def iter_read(self, path: str | list, chunk_size: int = None) -> Iterator[str]:
+        return self.__get_readable_file(path).iter_text(chunk_size or src.variant_options.read_chunk_size)
+
+    @routed
     def write(self, path: str | list, content: str) -> None:
         try:
             entry = self.__get_filesystem_entry(path)
-            if entry['type'] == 'file':
-                if self.__check_write_permission(path, self.username, self.groups):
-                    self.__write(path, content)
         except ValueError:
             try:
                 path = self.parse_path(path)
@@ -244,29 +969,145 @@ class Kernel:
                 raise ValueError(f'Invalid path: {path}')
             else:
                 self.__create_file(path[:-1], path[-1], self.username,
-                                   self.groups[0] if len(self.groups) > 0 else self.username, 640, content)
+                                   self.groups[0] if len(self.groups) > 0 else self.username, 0o640, content)
+        else:
+            if not isinstance(entry, FileNode):
+                raise ValueError('You can write only to files')
+            if not self.__check_write_permission(entry, self.username, self.groups):
+                raise Exception('Access denied')
+            self.__write(path, content, entry)
+        self.flush()
+
+    @routed
+    def open(self, path: str | list, mode: str = 'r') -> FileHandle:
+        if mode not in MODES:
+            raise ValueError(f'Invalid mode: {mode}')
+        if self.open_count >= src.variant_options.max_kernel_open_files:
+            raise ValueError('Too many open files in system')
+        readable, writable = MODES[mode]
+        path = tuple(self.parse_path(path))
+        try:
+            entry = self.__get_filesystem_entry(path)
+        except ValueError:
+            if mode[0] == 'r':
+                raise
+            self.__create_file(path[:-1], path[-1], self.username,
+                               self.groups[0] if len(self.groups) > 0 else self.username, 0o640)
+            self.flush()
+            entry = self.index[path]
+        if not isinstance(entry, FileNode):
+            raise ValueError('You can open only files')
+        if readable and not self.__check_read_permission(entry, self.username, self.groups) or \
+                writable and not self.__check_write_permission(entry, self.username, self.groups):
+            raise Exception('Access denied')
+        if mode[0] == 'w' and entry.size:
+            self.__write(path, '', entry)
+            self.flush()
+            entry = self.index[path]
+        # handles keep the absolute path, the server locks it and a mounted kernel only sees its own suffix
+        handle = FileHandle(self, self.prefix + path, entry, mode)
+        with self.lock:
+            self.open_files.setdefault(entry, set()).add(handle)
+            self.open_count += 1
+        return handle
+
+    def write_handle(self, handle: FileHandle, data: str) -> int:
+        node = handle.node
+        path = handle.path[len(self.prefix):]
+        size = node.size
+        position = size if handle.append else handle.position
+        if position >= size:
+            self.__append(path, '\0' * (position - size) + data, node)
+        else:
+            content = node.content.encode('utf-8')
+            encoded = data.encode('utf-8')
+            content = content[:position] + encoded + content[position + len(encoded):]
+            self.__write(path, content.decode('utf-8', 'replace'), node)
+        handle.position = position + text_size(data)
+        self.flush()
+        return len(data)
+
+    @locked
+    def close_handle(self, handle: FileHandle):
+        handles = self.open_files.get(handle.node)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del self.open_files[handle.node]
+        self.open_count -= 1
+
+    @routed
+    def append(self, path: str | list, data: str) -> None:
+        entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('You can write only to files')
+        if not self.__check_write_permission(entry, self.username, self.groups):
+            raise Exception('Access denied')
+        self.__append(path, data, entry)
         self.flush()
 
     # working with users
-    def get_existing_users(self):
-        entry = self.__get_filesystem_entry("")['content']['admin']['content']['users']['content']
-        return entry
+    def get_existing_users(self) -> UserDirectory:
+        return self.users
+
+    def get_user(self, username: str) -> UserRecord:
+        if username not in self.users:
+            raise ValueError("User don't exist")
+        record = self.users.get(username)
+        if record is None:
+            raise ValueError("User has no password set")
+        return record
+
+    def users_in_group(self, group: str) -> frozenset[str]:
+        return self.users.users_in_group(group)
+
+    def groups_of(self, username: str) -> tuple[str]:
+        return self.users.groups_of(username)
 
     def create_user(self, username: str):
         if self.username != "root":
             raise Exception('Access denied')
-        if username in self.get_existing_users():
+        if username in self.users:
             raise ValueError("User already exists")
-        if len(self.get_existing_users()) >= src.variant_options.max_users_amount:
+        if len(self.users) >= src.variant_options.max_users_amount:
             raise Exception("Users limit has been reached")
         else:
-            entry = self.__get_filesystem_entry("")['content']['admin']['content']['users']
             self.create_file("/admin/users/", username, 660)
 
+    def import_users(self, accounts: Iterable[tuple[str, list[str], str, str]], limit: int = None) -> dict[str, str]:
+        if self.username != "root":
+            raise Exception('Access denied')
+        if limit is None:
+            limit = src.variant_options.max_users_amount
+        rejected = {}
+        owner, group = self.username, self.groups[0] if self.groups else self.username
+        password = "*({})".format(str(datetime.date.today()))
+        # records are staged first and applied in one locked step, other sessions' writes never join the import
+        with self.lock:
+            staged = {}
+            for username, groups, hashed_password, confirmation_methods in accounts:
+                if username in self.users or username in staged:
+                    rejected[username] = 'User already exists'
+                    continue
+                if len(self.users) + len(staged) >= limit:
+                    rejected[username] = 'Users limit has been reached'
+                    continue
+                content = " ".join((username, password, ",".join(groups)))
+                if confirmation_methods:
+                    content = "\n".join((content, confirmation_methods))
+                staged[username] = ({'hashed_password': hashed_password, 'groups': list(groups)}, content)
+            for username, (credentials, content) in staged.items():
+                self.__set_credentials(username, credentials)
+                self.__create_file(USERS_PATH, username, owner, group, mode_from_permissions(660), content)
+        self.flush()
+        return rejected
+
     def remove_user(self, username: str):
-        if username not in self.get_existing_users():
+        if username not in self.users:
             raise ValueError("User don't exist")
         else:
+            if username in self.partition.get('users', {}):
+                self.__set_credentials(username, None)
             self.remove_file("/admin/users/" + username)
 
     def __update_user_data(self, username: str, password: str, groups: tuple | list, confirmation_methods = None):
@@ -276,71 +1117,113 @@ class Kernel:
             content = "\n".join((content, confirmation_methods))
         self.write(path, content)
 
-    def __check_password(self, password: str):
-        password_min_length = src.variant_options.password_length
-        should_contain_letters = 1
-        should_contain_numbers = 0
-        if len(password) < password_min_length:
-            raise ValueError("Password should contain at least {} characters".format(password_min_length))
-        if should_contain_numbers and not any(char.isdigit() for char in password):
-            raise ValueError("Password should contain numbers".format(password_min_length))
-        if should_contain_letters and not any(char.isalpha() for char in password):
-            raise ValueError("Password should contain letters".format(password_min_length))
-
     def change_user_password(self, username: str, password: str):
         if self.username != "root":
             raise Exception("Access denied")
-        if username not in self.get_existing_users():
+        if username not in self.users:
             raise ValueError("User don't exist")
         else:
-            self.__check_password(password)
-            password += "({})".format(str(datetime.date.today()))
-            if not self.read("/admin/users/" + username).content:
+            check_password_policy(password)
+            hashed_password = hash_password(password)
+            password = "*({})".format(str(datetime.date.today()))
+            record = self.users.get(username)
+            if record is None:
                 confirmation_methods = self.registrate_confirmation_methods(username)
+                self.__set_credentials(username, {'hashed_password': hashed_password, 'groups': [username]})
                 self.__update_user_data(username, password, [username], confirmation_methods=confirmation_methods)
                 return
-            user_data = self.__get_user_data(username)
-            confirmation_methods = "\n".join(user_data["confirmation_methods"])
-            self.__update_user_data(user_data["username"], password, user_data["groups"], confirmation_methods)
-
-    def __get_user_data(self, username: str):
-        path = "/admin/users/" + username
-        data = self.__get_file(path).content.split("\n")
-        user_data = data.pop(0).split()
-        user_groups = user_data[2].split(",")
-        return {"username": user_data[0], "password": user_data[1], "groups": user_groups, "confirmation_methods": data}
+            confirmation_methods = "\n".join(record.confirmation_methods)
+            self.__set_credentials(username, {'hashed_password': hashed_password, 'groups': record.groups})
+            self.__update_user_data(record.username, password, record.groups, confirmation_methods)
 
     def add_user_group(self, username: str, group: str):
         if self.username != "root":
             raise Exception("Access denied")
-        if username not in self.get_existing_users():
+        if username not in self.users:
             raise ValueError("User don't exist")
         else:
-            user_data = self.__get_user_data(username)
-            user_data["groups"].append(group)
-            confirmation_methods = "\n".join(user_data["confirmation_methods"])
-            self.__update_user_data(user_data["username"], user_data["password"], user_data["groups"], confirmation_methods)
+            record = self.get_user(username)
+            confirmation_methods = "\n".join(record.confirmation_methods)
+            self.__update_credential_groups(username, record.groups + [group])
+            self.__update_user_data(record.username, record.password_field, record.groups + [group],
+                                    confirmation_methods)
+            self.permission_cache.invalidate_user(username)
 
     def remove_user_group(self, username: str, group: str):
         if self.username != "root":
             raise Exception("Access denied")
-        if username not in self.get_existing_users():
+        if username not in self.users:
             raise ValueError("User don't exist")
         else:
-            user_data = self.__get_user_data(username)
-            if group in user_data["groups"]:
-                user_data["groups"].remove(group)
-            else:
+            record = self.get_user(username)
+            if group not in record.groups:
                 raise ValueError("User is not a part of this group")
-            confirmation_methods = "\n".join(user_data["confirmation_methods"])
-            self.__update_user_data(user_data["username"], user_data["password"], user_data["groups"], confirmation_methods)
+            groups = [user_group for user_group in record.groups if user_group != group]
+            confirmation_methods = "\n".join(record.confirmation_methods)
+            self.__update_credential_groups(username, groups)
+            self.__update_user_data(record.username, record.password_field, groups, confirmation_methods)
+            self.permission_cache.invalidate_user(username)
 
     def get_user_password(self, username: str):
-        user_data = self.__get_user_data(username)
-        password_string = user_data["password"]
-        password = password_string.split("(")[0]
-        date = password_string[password_string.find("(")+1 : password_string.find(")")]
-        return {"password": password, "creation_date": date}
+        record = self.get_user(username)
+        credentials = self.partition.setdefault('users', {}).get(username, {})
+        return {"hashed_password": credentials.get('hashed_password'), "creation_date": str(record.creation_date)}
+
+    @locked
+    def __set_credentials(self, username: str, credentials: dict | None):
+        users = self.partition.setdefault('users', {})
+        self.__remember('credentials', username, users.get(username))
+        self.__restore_credentials(username, credentials)
+        if self.journal:
+            self.journal.record('credentials', list(USERS_PATH) + [username], credentials=credentials)
+
+    def __restore_credentials(self, username: str, credentials: dict | None):
+        users = self.__own_section('users')
+        if credentials is None:
+            users.pop(username, None)
+        else:
+            users[username] = credentials
+        self.credentials.invalidate(username)
+
+    def __update_credential_groups(self, username: str, groups: list[str]):
+        credentials = self.partition.setdefault('users', {}).get(username)
+        if credentials is not None:
+            self.__set_credentials(username, {**credentials, 'groups': list(groups)})
+
+    def password_needs_upgrade(self, username: str) -> bool:
+        encoded = (self.partition.get('users', {}).get(username) or {}).get('hashed_password')
+        return not is_hashed(encoded) or needs_rehash(encoded)
+
+    def verify_password(self, username: str, password: str, upgrade: bool = True) -> bool:
+        record = self.get_user(username)
+        credentials = self.partition.setdefault('users', {}).get(username) or {}
+        encoded = credentials.get('hashed_password')
+        if is_hashed(encoded):
+            if not self.credentials.verify(username, password, encoded):
+                return False
+            if upgrade and needs_rehash(encoded):
+                encoded = hash_password(password)
+                self.__set_credentials(username, {**credentials, 'hashed_password': encoded})
+                self.credentials.remember(username, password, encoded)
+                self.flush()
+            return True
+        # legacy partitions keep the password in the user file, upgrade it on the first successful login
+        if record.password == '*' or not hmac.compare_digest(record.password.encode('utf-8'), password.encode('utf-8')):
+            return False
+        if not upgrade:
+            return True
+        encoded = hash_password(password)
+        self.__set_credentials(username, {'hashed_password': encoded, 'groups': record.groups})
+        content = " ".join((username, "*({})".format(record.creation_date), ",".join(record.groups)))
+        if record.confirmation_methods:
+            content = "\n".join((content, "\n".join(record.confirmation_methods)))
+        self.__write(list(USERS_PATH) + [username], content)
+        self.credentials.remember(username, password, encoded)
+        self.flush()
+        return True
+
+    def get_control_questions(self) -> list[str]:
+        return self.__get_file("/admin/control_questions").content.split("\n")
 
     def __get_control_questions(self) -> dict:
         questions = self.read("/admin/control_questions").content.split("\n")
@@ -375,27 +1258,20 @@ class Kernel:
                 a = input("Input a: ")
                 return "f:\n" + a
 
-    def confirm_identity(self, username: str):
-        print("Please, confirm_your identity")
-        confirmation_data = self.__get_user_data(username)["confirmation_methods"]
-        confirmation_method = confirmation_data[0][:1]
+    def create_identity_challenge(self, username: str) -> Challenge:
+        confirmation_data = self.get_user(username).confirmation_methods
+        confirmation_method = confirmation_data[0][:1] if confirmation_data else ''
+        attempts = src.variant_options.wrong_answers_amount
+        timeout = src.variant_options.confirmation_timeout
         match confirmation_method:
 
             case "f":
                 a = int(confirmation_data[1])
                 x = random.randint(0, 100)
-                # print(round(src.variant_options.secret_function(a, x), 2))  # the answer
-                print("Calculate the secret function using given parameters and write the answer (rounded to 2 characters after comma)")
-                print("x = {}".format(x))
-                attempts_number = 0
-                while attempts_number < src.variant_options.wrong_answers_amount:
-                    answer = float(input("Answer: "))
-                    if answer == round(src.variant_options.secret_function(a, x), 2):
-                        return
-                    else:
-                        print("Wrong!")
-                    attempts_number += 1
-                raise Exception("User not identified")
+                prompt = "Calculate the secret function using given parameters and write the answer " \
+                         "(rounded to 2 characters after comma)\nx = {}".format(x)
+                return Challenge(username, prompt, round(src.variant_options.secret_function(a, x), 2), True,
+                                 attempts, timeout)
 
             case "q":
                 answers = {}
@@ -404,13 +1280,85 @@ class Kernel:
                     item = item.split()
                     answers[int(item[0][:1])] = item[1]
                 random_question_number = random.choice(tuple(answers.keys()))
-                print(questions[random_question_number-1])
-                attempts_number = 0
-                while attempts_number < src.variant_options.wrong_answers_amount:
-                    answer = input("Answer: ")
-                    if answer == answers[random_question_number]:
-                        return
-                    else:
-                        print("Wrong!")
-                    attempts_number += 1
-                raise Exception("User not identified")
+                return Challenge(username, questions[random_question_number-1], answers[random_question_number],
+                                 False, attempts, timeout)
+
+        raise Exception("User has no confirmation methods")
+
+
+class SnapshotView:
+    parse_path = Kernel.parse_path
+
+    def __init__(self, kernel: Kernel, checkpoint: Checkpoint):
+        self.kernel: Kernel = kernel
+        self.checkpoint: Checkpoint = checkpoint
+
+    @property
+    def name(self) -> str:
+        return self.checkpoint.name
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.kernel.metrics
+
+    def __get_filesystem_entry(self, path: str | list) -> FileNode | DirNode:
+        path = self.parse_path(path)
+        node = self.checkpoint.root
+        for name in path:
+            if not isinstance(node, DirNode) or name not in node.children:
+                raise ValueError(f'Invalid path: {"/"+"/".join(path)}')
+            node = node.children[name]
+        return node
+
+    def get_directory_content(self, path: str | list) -> tuple[str]:
+        entry = self.__get_filesystem_entry(path)
+        if isinstance(entry, FileNode):
+            raise ValueError(f'This is file')
+        return tuple(entry.children.keys())
+
+    def scandir(self, path: str | list) -> DirListing:
+        entry = self.__get_filesystem_entry(path)
+        if isinstance(entry, FileNode):
+            raise ValueError(f'This is file')
+        username, groups = self.kernel.username, self.kernel.groups
+        return DirListing(entry, self.kernel.names, lambda node: self.kernel.can_read(node, username, groups))
+
+    def get_acl(self, path: str | list) -> list[str]:
+        entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('ACLs can be set only on files')
+        return entry.acl.entries(self.kernel.names) if entry.acl is not None else []
+
+    def walk(self, path: str | list) -> Iterator[tuple[tuple, DirEntry]]:
+        path = tuple(self.parse_path(path))
+        yield from self.kernel.walk_from(path, self.__get_filesystem_entry(path), False)
+
+    def __get_readable_file(self, path: str | list) -> FileNode:
+        entry = self.__get_filesystem_entry(path)
+        if not isinstance(entry, FileNode):
+            raise ValueError('You can read only files')
+        if not self.kernel.can_read(entry):
+            raise Exception('Access denied')
+        return entry
+
+    def open(self, path: str | list, mode: str = 'r') -> FileHandle:
+        if mode != 'r':
+            raise ValueError(f'Snapshot {self.name} is mounted read-only')
+        return FileHandle(self, tuple(self.parse_path(path)), self.__get_readable_file(path), mode)
+
+    def close_handle(self, handle: FileHandle):
+        pass
+
+    def read_range(self, path: str | list, offset: int, length: int) -> bytes:
+        return self.__get_readable_file(path).read_range(offset, length)
+
+    def iter_read(self, path: str | list, chunk_size: int = None) -> Iterator[str]:
+        return self.__get_readable_file(path).iter_text(chunk_size or src.variant_options.read_chunk_size)
+
+    def read(self, path: str | list) -> File | Directory:
+        path = self.parse_path(path)
+        entry = self.__get_filesystem_entry(path)
+        if isinstance(entry, FileNode):
+            return File(path[-1], f'/{"/".join(path[:-1])}', entry, self.kernel.names,
+                        not self.kernel.can_read(entry))
+        return Directory(f'/{"/".join(path)}')
@@ -0,0 +1,93 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+# intent modes: a lock on a path takes IS/IX on every ancestor, so it conflicts with locks above and below it
+COMPATIBLE = {'IS': {'IS', 'IX', 'S'}, 'IX': {'IS', 'IX'}, 'S': {'IS', 'S'}, 'X': set()}
+
+
+def combine(mode: str | None, other: str) -> str:
+    if mode is None or mode == other:
+        return other
+    if {mode, other} == {'IS', 'IX'}:
+        return 'IX'
+    if {mode, other} == {'IS', 'S'}:
+        return 'S'
+    return 'X'  # S with IX would need SIX, an exclusive lock covers it
+
+
+class IntentLock:
+    def __init__(self):
+        self.held: dict[str, int] = dict.fromkeys(COMPATIBLE, 0)
+        self.waiting: list[list[str]] = []
+        self.wakeups: list[asyncio.Future] = []
+
+    def __grantable(self, request: list[str]) -> bool:
+        compatible = COMPATIBLE[request[0]]
+        if any(count and mode not in compatible for mode, count in self.held.items()):
+            return False
+        # requests are granted in arrival order, so a stream of compatible requests can't starve an earlier one
+        for waiting in self.waiting:
+            if waiting is request:
+                return True
+            if waiting[0] not in compatible:
+                return False
+        return True
+
+    def __wake(self):
+        wakeups, self.wakeups = self.wakeups, []
+        for wakeup in wakeups:
+            if not wakeup.done():
+                wakeup.set_result(None)
+
+    async def acquire(self, mode: str):
+        # the state only changes between awaits of the event loop thread, so it needs no lock of its own
+        request = [mode]
+        self.waiting.append(request)
+        try:
+            while not self.__grantable(request):
+                wakeup = asyncio.get_running_loop().create_future()
+                self.wakeups.append(wakeup)
+                await wakeup
+        finally:
+            self.waiting = [waiting for waiting in self.waiting if waiting is not request]
+            self.__wake()
+        self.held[mode] += 1
+
+    def release(self, mode: str):
+        self.held[mode] -= 1
+        self.__wake()
+
+    @property
+    def idle(self) -> bool:
+        return not (any(self.held.values()) or self.waiting)
+
+
+class PathLocks:
+    def __init__(self):
+        self.locks: dict[tuple, IntentLock] = {}
+
+    @staticmethod
+    def plan(reads: set[tuple], writes: set[tuple]) -> list[tuple[tuple, str]]:
+        modes: dict[tuple, str] = {}
+        for path in reads | writes:
+            write = path in writes
+            for depth in range(len(path)):
+                modes[path[:depth]] = combine(modes.get(path[:depth]), 'IX' if write else 'IS')
+            modes[path] = combine(modes.get(path), 'X' if write else 'S')
+        # ancestors sort before their descendants, every session locks in the same order
+        return sorted(modes.items())
+
+    @asynccontextmanager
+    async def hold(self, reads: set[tuple], writes: set[tuple]):
+        acquired = []
+        try:
+            for path, mode in self.plan(reads, writes):
+                lock = self.locks.setdefault(path, IntentLock())
+                await lock.acquire(mode)
+                acquired.append((path, lock, mode))
+            yield
+        finally:
+            for path, lock, mode in reversed(acquired):
+                lock.release(mode)
+                if lock.idle and self.locks.get(path) is lock:
+                    del self.locks[path]
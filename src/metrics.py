@@ -0,0 +1,104 @@
+import bisect
+import os
+import time
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts: list[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, prefix: str = 'sdss'):
+        self.enabled: bool = enabled
+        self.prefix: str = prefix
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.sources: dict[str, object] = {}
+        self.started: float = time.time()
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, command: str, seconds: float):
+        histogram = self.histograms.get(command)
+        if histogram is None:
+            histogram = self.histograms[command] = Histogram()
+        histogram.observe(seconds)
+
+    def timed(self, command: str, lines, started: float):
+        try:
+            yield from lines
+        finally:
+            self.observe(command, time.perf_counter() - started)
+
+    def register(self, name: str, stats):
+        self.sources[name] = stats
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+        self.started = time.time()
+
+    def report(self):
+        yield f'{"command":<12}{"count":>8}{"mean ms":>10}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}'
+        for command, histogram in sorted(self.histograms.items()):
+            yield (f'{command:<12}{histogram.count:>8}{histogram.sum / histogram.count * 1000:>10.3f}'
+                   f'{histogram.quantile(0.5) * 1000:>10.3f}{histogram.quantile(0.99) * 1000:>10.3f}'
+                   f'{histogram.max * 1000:>10.3f}')
+        for name, value in sorted(self.counters.items()):
+            yield f'{name:<32}{value:>12}'
+        for source, stats in self.sources.items():
+            for name, value in stats().items():
+                yield f'{source + "_" + name:<32}{value:>12}'
+
+    def prometheus(self) -> str:
+        lines = [f'# HELP {self.prefix}_command_seconds Shell command latency',
+                 f'# TYPE {self.prefix}_command_seconds histogram']
+        for command, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f'{self.prefix}_command_seconds_bucket{{command="{command}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.prefix}_command_seconds_sum{{command="{command}"}} {histogram.sum}')
+            lines.append(f'{self.prefix}_command_seconds_count{{command="{command}"}} {histogram.count}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            lines.append(f'{self.prefix}_{name}_total {value}')
+        for source, stats in self.sources.items():
+            for name, value in stats().items():
+                lines.append(f'# TYPE {self.prefix}_{source}_{name} gauge')
+                lines.append(f'{self.prefix}_{source}_{name} {value}')
+        lines.append(f'# TYPE {self.prefix}_start_time_seconds gauge')
+        lines.append(f'{self.prefix}_start_time_seconds {self.started}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as metrics_file:
+            metrics_file.write(self.prometheus())
+        os.replace(tmp_path, path)
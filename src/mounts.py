@@ -0,0 +1,94 @@
+import functools
+import os
+import threading
+
+
+def partition_file(base: str, partition_path: str) -> str:
+    # mounted partitions live in the main partition's directory tree, a mount can't reach other host files
+    base = os.path.realpath(base)
+    path = os.path.realpath(os.path.join(base, partition_path))
+    if path == base or os.path.commonpath((base, path)) != base:
+        raise ValueError(f'Partition must be inside {base}: {partition_path}')
+    return path
+
+
+class Mount:
+    __slots__ = ('path', 'partition_path', 'kernel')
+
+    def __init__(self, path: tuple, partition_path: str):
+        self.path: tuple = path
+        self.partition_path: str = partition_path
+        self.kernel = None
+
+
+class MountTable:
+    def __init__(self, load):
+        self.load = load
+        self.mounts: dict[tuple, Mount] = {}
+        self.depths: list[int] = []
+        self.lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.mounts)
+
+    def __iter__(self):
+        return iter(self.mounts.values())
+
+    def reset(self, entries: dict[str, str], base: str):
+        self.close()
+        self.mounts = {}
+        for path, partition_path in entries.items():
+            self.add(tuple(filter(None, path.split('/'))), partition_file(base, partition_path))
+
+    def add(self, path: tuple, partition_path: str) -> Mount:
+        mount = self.mounts[path] = Mount(path, partition_path)
+        self.depths = sorted({len(path) for path in self.mounts}, reverse=True)
+        return mount
+
+    def remove(self, path: tuple) -> Mount:
+        mount = self.mounts.pop(path)
+        self.depths = sorted({len(path) for path in self.mounts}, reverse=True)
+        return mount
+
+    def find(self, path: tuple) -> Mount | None:
+        for depth in self.depths:
+            if depth <= len(path):
+                mount = self.mounts.get(path[:depth])
+                if mount is not None:
+                    return mount
+        return None
+
+    def kernel(self, mount: Mount):
+        if mount.kernel is None:
+            with self.lock:
+                if mount.kernel is None:
+                    mount.kernel = self.load(mount)
+        return mount.kernel
+
+    def route(self, path: tuple) -> tuple | None:
+        mount = self.find(path)
+        if mount is None:
+            return None
+        return self.kernel(mount), list(path[len(mount.path):])
+
+    def loaded(self) -> list:
+        return [mount.kernel for mount in self.mounts.values() if mount.kernel is not None]
+
+    def close(self):
+        for kernel in self.loaded():
+            kernel.close()
+        for mount in self.mounts.values():
+            mount.kernel = None
+
+
+def routed(method):
+    # paths below a mount point are served by the kernel of the mounted partition
+    @functools.wraps(method)
+    def wrapper(self, path, *args, **kwargs):
+        if self.mounts.mounts:
+            target = self.mounts.route(tuple(self.parse_path(path)))
+            if target is not None:
+                kernel, path = target
+                return getattr(kernel, method.__name__)(path, *args, **kwargs)
+        return method(self, path, *args, **kwargs)
+    return wrapper
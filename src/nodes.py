@@ -0,0 +1,314 @@
+import codecs
+import json
+from typing import Iterator
+
+
+class NameTable:
+    __slots__ = ('names', 'ids')
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        try:
+            return self.ids[name]
+        except KeyError:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            return self.ids[name]
+
+    def name(self, name_id: int) -> str:
+        return self.names[name_id]
+
+
+class LazyContent:
+    __slots__ = ('source', 'offset', 'length', 'decoded_size')
+
+    def __init__(self, source, offset: int, length: int, decoded_size: int | None = None):
+        self.source = source
+        self.offset: int = offset
+        self.length: int = length
+        self.decoded_size: int | None = decoded_size
+
+    def raw(self) -> str:
+        return self.source.read(self.offset, self.length)
+
+    def load(self) -> str:
+        return json.loads(self.raw())
+
+    @property
+    def size(self) -> int:
+        if self.decoded_size is None:
+            self.decoded_size = text_size(self.load())
+        return self.decoded_size
+
+    def range(self, start: int, length: int) -> bytes:
+        return text_range(self.load(), start, length)
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        yield from text_chunks(self.load(), chunk_size)
+
+
+class MappedContent:
+    __slots__ = ('source', 'offset', 'length', 'capacity')
+
+    def __init__(self, source, offset: int, length: int, capacity: int):
+        self.source = source
+        self.offset: int = offset
+        self.length: int = length
+        self.capacity: int = capacity
+
+    def raw(self) -> bytes:
+        return self.source.map[self.offset:self.offset + self.length]
+
+    def load(self) -> str:
+        return self.source.text(self.offset, self.length)
+
+    @property
+    def size(self) -> int:
+        return self.length
+
+    def range(self, start: int, length: int) -> bytes:
+        start = self.offset + min(start, self.length)
+        return bytes(self.source.view[start:min(start + length, self.offset + self.length)])
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        for start in range(0, self.length, chunk_size):
+            yield self.range(start, chunk_size)
+
+
+class AppendedContent:
+    __slots__ = ('base', 'suffix')
+
+    def __init__(self, base, suffix: str):
+        self.base = base
+        self.suffix: str = suffix
+
+    def load(self) -> str:
+        return (self.base if self.base.__class__ is str else self.base.load()) + self.suffix
+
+    @property
+    def size(self) -> int:
+        return content_size(self.base) + text_size(self.suffix)
+
+    def range(self, start: int, length: int) -> bytes:
+        base_size = content_size(self.base)
+        head = content_range(self.base, start, length) if start < base_size else b''
+        if start + length <= base_size:
+            return head
+        return head + text_range(self.suffix, max(start - base_size, 0), length - len(head))
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        yield from content_chunks(self.base, chunk_size)
+        yield from text_chunks(self.suffix, chunk_size)
+
+
+def text_size(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def text_range(text: str, start: int, length: int) -> bytes:
+    if text.isascii():
+        return text[start:start + length].encode('ascii')
+    return text.encode('utf-8')[start:start + length]
+
+
+def text_chunks(text: str, chunk_size: int) -> Iterator[bytes]:
+    encoded = text.encode('utf-8')
+    for start in range(0, len(encoded), chunk_size):
+        yield encoded[start:start + chunk_size]
+
+
+def content_size(data) -> int:
+    return text_size(data) if data.__class__ is str else data.size
+
+
+def content_range(data, start: int, length: int) -> bytes:
+    return text_range(data, start, length) if data.__class__ is str else data.range(start, length)
+
+
+def content_chunks(data, chunk_size: int) -> Iterator[bytes]:
+    return text_chunks(data, chunk_size) if data.__class__ is str else data.chunks(chunk_size)
+
+
+class FileNode:
+    __slots__ = ('owner', 'group', 'mode', 'data', 'acl', 'fragment', 'epoch')
+
+    def __init__(self, owner: int, group: int, mode: int, content, epoch: int = 0):
+        self.owner: int = owner
+        self.group: int = group
+        self.mode: int = mode
+        self.data = content
+        self.acl: Acl | None = None
+        self.fragment: str | None = None
+        self.epoch: int = epoch
+
+    def copy(self, epoch: int) -> 'FileNode':
+        node = FileNode(self.owner, self.group, self.mode, self.data, epoch)
+        node.acl = self.acl
+        node.fragment = self.fragment
+        return node
+
+    @property
+    def content(self) -> str:
+        data = self.data
+        if data.__class__ is str:
+            return data
+        if data.__class__ is LazyContent or data.__class__ is AppendedContent:
+            data = self.data = data.load()
+            return data
+        return data.load()
+
+    @content.setter
+    def content(self, content: str):
+        self.data = content
+
+    @property
+    def size(self) -> int:
+        data = self.data
+        if data.__class__ is LazyContent and data.decoded_size is None:
+            data = self.content
+        return content_size(data)
+
+    def read_range(self, start: int, length: int) -> bytes:
+        data = self.data
+        if data.__class__ is LazyContent:
+            data = self.content
+        return content_range(data, start, length)
+
+    def iter_text(self, chunk_size: int) -> Iterator[str]:
+        data = self.data
+        if data.__class__ is LazyContent:
+            data = self.content
+        if data.__class__ is str:
+            for start in range(0, len(data), chunk_size):
+                yield data[start:start + chunk_size]
+            return
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in data.chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', True)
+        if text:
+            yield text
+
+
+class DirNode:
+    __slots__ = ('children', 'fragment', 'epoch')
+
+    def __init__(self, children: dict = None, epoch: int = 0):
+        self.children: dict[str, FileNode | DirNode] = children if children is not None else {}
+        self.fragment: str | tuple | None = None
+        self.epoch: int = epoch
+
+    def copy(self, epoch: int) -> 'DirNode':
+        node = DirNode(dict(self.children), epoch)
+        node.fragment = self.fragment
+        return node
+
+
+def mode_from_permissions(permissions: int) -> int:
+    return (permissions // 100 % 10 & 7) << 6 | (permissions // 10 % 10 & 7) << 3 | permissions % 10 & 7
+
+
+def permissions_from_mode(mode: int) -> int:
+    return (mode >> 6 & 7) * 100 + (mode >> 3 & 7) * 10 + (mode & 7)
+
+
+def mode_to_str(mode: int) -> str:
+    return MODE_STRINGS[mode & 0o777]
+
+
+PERMISSION_LETTERS = 'rwx'
+KINDS = {'u': 'user', 'user': 'user', 'g': 'group', 'group': 'group'}
+
+
+def perms_from_str(perms: str) -> int:
+    if perms.isdigit() and len(perms) == 1 and int(perms) < 8:
+        return int(perms)
+    if perms and len(set(perms)) == len(perms) and set(perms) <= set(PERMISSION_LETTERS):
+        return sum(4 >> PERMISSION_LETTERS.index(letter) for letter in perms)
+    if len(perms) != 3 or any(letter not in (expected, '-') for letter, expected in zip(perms, PERMISSION_LETTERS)):
+        raise ValueError(f'Invalid ACL permissions: {perms}')
+    return sum(4 >> i for i, letter in enumerate(perms) if letter != '-')
+
+
+def perms_to_str(perms: int) -> str:
+    return ''.join(letter if perms & 4 >> i else '-' for i, letter in enumerate(PERMISSION_LETTERS))
+
+
+MODE_STRINGS = tuple(perms_to_str(mode >> 6) + perms_to_str(mode >> 3 & 7) + perms_to_str(mode & 7)
+                     for mode in range(0o1000))
+
+
+def parse_entry(entry: str) -> tuple[str, str, int | None]:
+    parts = entry.split(':')
+    if len(parts) not in (2, 3) or parts[0] not in KINDS or not parts[1]:
+        raise ValueError(f'Invalid ACL entry: {entry}')
+    return KINDS[parts[0]], parts[1], perms_from_str(parts[2]) if len(parts) == 3 else None
+
+
+class Acl:
+    __slots__ = ('users', 'groups', 'group_bits')
+
+    def __init__(self, users: dict[int, int], groups: dict[int, int]):
+        self.users: dict[int, int] = users
+        self.groups: dict[int, int] = groups
+        self.group_bits: int = 0
+        for group in groups:
+            self.group_bits |= 1 << group
+
+    def __len__(self):
+        return len(self.users) + len(self.groups)
+
+    def __eq__(self, other):
+        return isinstance(other, Acl) and self.users == other.users and self.groups == other.groups
+
+    @classmethod
+    def parse(cls, entries: list[str], names: NameTable) -> 'Acl | None':
+        users, groups = {}, {}
+        for entry in entries:
+            kind, name, perms = parse_entry(entry)
+            if perms is None:
+                raise ValueError(f'Missing ACL permissions: {entry}')
+            (users if kind == 'user' else groups)[names.intern(name)] = perms
+        return cls(users, groups) if users or groups else None
+
+    def entries(self, names: NameTable) -> list[str]:
+        return [f'user:{names.name(user)}:{perms_to_str(perms)}' for user, perms in self.users.items()] + \
+               [f'group:{names.name(group)}:{perms_to_str(perms)}' for group, perms in self.groups.items()]
+
+    def group_mask(self, group_bits: int) -> int | None:
+        common = group_bits & self.group_bits
+        if not common:
+            return None
+        mask = 0
+        while common:
+            lowest = common & -common
+            mask |= self.groups[lowest.bit_length() - 1]
+            common ^= lowest
+        return mask
+
+
+def node_from_dict(entry: dict, names: NameTable) -> FileNode | DirNode:
+    if entry['type'] == 'directory':
+        return DirNode({name: node_from_dict(child, names) for name, child in entry['content'].items()})
+    node = FileNode(names.intern(entry['owner']), names.intern(entry['group']),
+                    mode_from_permissions(entry['permissions']), entry['content'])
+    if 'acl' in entry:
+        node.acl = Acl.parse(entry['acl'], names)
+    return node
+
+
+def node_to_dict(node: FileNode | DirNode, names: NameTable) -> dict:
+    if isinstance(node, DirNode):
+        return {'type': 'directory', 'content': {name: node_to_dict(child, names)
+                                                 for name, child in node.children.items()}}
+    entry = {'type': 'file', 'owner': names.name(node.owner), 'group': names.name(node.group),
+             'permissions': permissions_from_mode(node.mode)}
+    if node.acl is not None:
+        entry['acl'] = node.acl.entries(names)
+    entry['content'] = node.content
+    return entry
@@ -0,0 +1,116 @@
+import codecs
+
+import src.variant_options
+from src.nodes import FileNode
+
+MODES = {'r': (True, False), 'r+': (True, True), 'w': (False, True), 'w+': (True, True), 'a': (False, True),
+         'a+': (True, True)}
+
+
+class FileHandle:
+    __slots__ = ('kernel', 'path', 'node', 'mode', 'readable', 'writable', 'append', 'position', 'closed', 'stale')
+
+    def __init__(self, kernel, path: tuple, node: FileNode, mode: str):
+        self.kernel = kernel
+        self.path: tuple = path
+        self.node: FileNode = node
+        self.mode: str = mode
+        self.readable, self.writable = MODES[mode]
+        self.append: bool = mode[0] == 'a'
+        self.position: int = 0
+        self.closed: bool = False
+        self.stale: bool = False
+
+    def __check(self, allowed: bool, action: str):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        if self.stale:
+            raise ValueError(f'Stale file handle: /{"/".join(self.path)}')
+        if not allowed:
+            raise ValueError(f'File not open for {action}')
+
+    def read(self, length: int = -1) -> str:
+        self.__check(self.readable, 'reading')
+        size = self.node.size
+        if length < 0 or self.position + length > size:
+            length = size - self.position
+        data = self.node.read_range(self.position, length)
+        text, consumed = codecs.utf_8_decode(data, 'replace', self.position + len(data) >= size)
+        if not consumed and data:
+            # the range ends inside a multibyte character, finish that character
+            data = self.node.read_range(self.position, length + 3)
+            text, consumed = codecs.utf_8_decode(data, 'replace', self.position + len(data) >= size)
+        self.position += consumed
+        return text
+
+    def pread(self, offset: int, length: int) -> bytes:
+        self.__check(self.readable, 'reading')
+        return self.node.read_range(offset, length)
+
+    def write(self, data: str) -> int:
+        self.__check(self.writable, 'writing')
+        return self.kernel.write_handle(self, data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.__check(True, 'seeking')
+        match whence:
+            case 0:
+                position = offset
+            case 1:
+                position = self.position + offset
+            case 2:
+                position = self.node.size + offset
+            case _:
+                raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise ValueError('Negative seek position')
+        self.position = position
+        return position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.kernel.close_handle(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class OpenFileTable:
+    def __init__(self, limit: int = None):
+        self.limit: int = limit or src.variant_options.max_open_files
+        self.handles: dict[int, FileHandle] = {}
+
+    def __len__(self):
+        return len(self.handles)
+
+    def open(self, kernel, path: str | list | tuple, mode: str = 'r') -> int:
+        if len(self.handles) >= self.limit:
+            raise ValueError('Too many open files')
+        handle = kernel.open(path, mode)
+        fd = 0
+        while fd in self.handles:
+            fd += 1
+        self.handles[fd] = handle
+        return fd
+
+    def get(self, fd: int) -> FileHandle:
+        try:
+            return self.handles[fd]
+        except (KeyError, TypeError):
+            raise ValueError(f'Bad file descriptor: {fd}')
+
+    def close(self, fd: int):
+        self.get(fd).close()
+        del self.handles[fd]
+
+    def close_all(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
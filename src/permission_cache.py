@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class PermissionCache:
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.masks: OrderedDict[tuple, int] = OrderedDict()
+        self.by_node: dict[object, set[tuple]] = {}
+        self.by_user: dict[str, set[tuple]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self.lock = threading.Lock()
+
+    def mask(self, node, username: str, group_bits: int, compute) -> int:
+        key = (node, username, group_bits)
+        with self.lock:
+            try:
+                mask = self.masks[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.masks.move_to_end(key)
+                return mask
+        mask = compute(node, username, group_bits)
+        with self.lock:
+            self.masks[key] = mask
+            self.by_node.setdefault(node, set()).add(key)
+            self.by_user.setdefault(username, set()).add(key)
+            if len(self.masks) > self.max_size:
+                self.__forget(next(iter(self.masks)))
+        return mask
+
+    def __forget(self, key: tuple):
+        del self.masks[key]
+        for index, owner in ((self.by_node, key[0]), (self.by_user, key[1])):
+            keys = index[owner]
+            keys.discard(key)
+            if not keys:
+                del index[owner]
+
+    def invalidate_node(self, node):
+        with self.lock:
+            for key in tuple(self.by_node.get(node, ())):
+                self.__forget(key)
+                self.invalidations += 1
+
+    def invalidate_user(self, username: str):
+        with self.lock:
+            for key in tuple(self.by_user.get(username, ())):
+                self.__forget(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.masks.clear()
+            self.by_node.clear()
+            self.by_user.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self.masks), 'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations}
@@ -0,0 +1,72 @@
+import re
+
+TOKEN = re.compile(r'''\s*(?:(>>|[|>])|((?:[^\s'"\\|>]+|\\.|'[^']*'|"(?:[^"\\]|\\.)*")+)|(\S))''', re.S)
+PART = re.compile(r'''([^'"\\]+)|\\(.)|'([^']*)'|"((?:[^"\\]|\\.)*)"''', re.S)
+ESCAPE = re.compile(r'\\([\\"$`])')
+
+
+class Pipeline:
+    __slots__ = ('stages', 'redirect', 'append')
+
+    def __init__(self, stages: list[list[str]], redirect: str | None = None, append: bool = False):
+        self.stages: list[list[str]] = stages
+        self.redirect: str | None = redirect
+        self.append: bool = append
+
+    @property
+    def simple(self) -> bool:
+        return len(self.stages) == 1 and self.redirect is None
+
+    @property
+    def names(self) -> list[str]:
+        return [stage[0] for stage in self.stages]
+
+
+def unquote(word: str) -> str:
+    if '\\' not in word and '"' not in word and "'" not in word:
+        return word
+    parts = []
+    for plain, escaped, single, double in PART.findall(word):
+        parts.append(plain or escaped or single or ESCAPE.sub(r'\1', double))
+    return ''.join(parts)
+
+
+def tokenize(line: str) -> list[tuple[str, bool]]:
+    tokens = []
+    position, end = 0, len(line.rstrip())
+    while position < end:
+        match = TOKEN.match(line, position)
+        operator, word, stray = match.groups()
+        if stray is not None:
+            raise ValueError('No closing quotation' if stray in '\'"' else f'Unexpected character: {stray}')
+        tokens.append((operator, True) if operator else (unquote(word), False))
+        position = match.end()
+    return tokens
+
+
+def parse_pipeline(line: str) -> Pipeline | None:
+    tokens = tokenize(line)
+    if not tokens:
+        return None
+    stages, stage = [], []
+    redirect, append = None, False
+    tokens = iter(tokens)
+    for token, operator in tokens:
+        if redirect is not None:
+            raise ValueError('Redirection must end the command line')
+        if not operator:
+            stage.append(token)
+        elif token == '|':
+            if not stage:
+                raise ValueError('Empty command in pipeline')
+            stages.append(stage)
+            stage = []
+        else:
+            target, target_operator = next(tokens, (None, True))
+            if target_operator or not stage:
+                raise ValueError(f'Missing file name after {token}')
+            redirect, append = target, token == '>>'
+    if not stage:
+        raise ValueError('Empty command in pipeline')
+    stages.append(stage)
+    return Pipeline(stages, redirect, append)
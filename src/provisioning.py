@@ -0,0 +1,185 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TextIO
+
+import src.variant_options
+from src.credentials import check_password_policy, hash_password, is_hashed
+from src.kernel import Kernel
+
+NAME_PATTERN = re.compile(r'[A-Za-z0-9_.-]+')
+MAX_QUESTIONS = 9  # confirmation answers are keyed by a single digit in the user file
+
+
+class Account:
+    __slots__ = ('line', 'username', 'groups', 'hashed_password', 'confirmation_methods')
+
+    def __init__(self, line: int, username: str, groups: list[str], hashed_password: str, confirmation_methods: str):
+        self.line: int = line
+        self.username: str = username
+        self.groups: list[str] = groups
+        self.hashed_password: str = hashed_password
+        self.confirmation_methods: str = confirmation_methods
+
+
+class ImportReport:
+    def __init__(self):
+        self.created: list[str] = []
+        self.errors: list[tuple[int, str, str]] = []
+        self.elapsed: float = 0
+
+    def lines(self):
+        for line, username, error in self.errors:
+            yield f'line {line}: {username or "-"}: {error}'
+        yield f'{len(self.created)} users imported in {self.elapsed:.2f} s, {len(self.errors)} rejected'
+
+
+def read_records(path: str) -> list[tuple[int, dict | None]]:
+    with open(path, encoding='utf-8', newline='') as records_file:
+        return parse_records(path, records_file)
+
+
+def parse_records(name: str, records_file: TextIO) -> list[tuple[int, dict | None]]:
+    records = []
+    if name.endswith('.csv'):
+        reader = csv.DictReader(records_file)
+        for fields in reader:
+            records.append((reader.line_num, fields))
+        return records
+    for line, text in enumerate(records_file, 1):
+        if not text.strip():
+            continue
+        try:
+            fields = json.loads(text)
+        except json.JSONDecodeError:
+            fields = None
+        records.append((line, fields if isinstance(fields, dict) else None))
+    return records
+
+
+def __names(value) -> list[str]:
+    if isinstance(value, str):
+        return [name for name in re.split(r'[\s,;]+', value) if name]
+    if isinstance(value, list) and all(isinstance(name, str) for name in value):
+        return value
+    raise ValueError('Groups should be a list of names')
+
+
+def __questions(value) -> dict[int, str]:
+    if isinstance(value, str):
+        value = dict(item.split('=', 1) for item in filter(None, value.split(';')))
+    if not isinstance(value, dict):
+        raise ValueError('Questions should map question numbers to answers')
+    return {int(number): str(answer) for number, answer in value.items()}
+
+
+def __confirmation_methods(fields: dict, question_count: int) -> str:
+    questions, function = fields.get('questions') or None, fields.get('function')
+    if function in ('', None):
+        function = None
+    if (questions is None) == (function is None):
+        raise ValueError('Exactly one confirmation method (questions or function) is required')
+    if function is not None:
+        return f'f:\n{int(function)}'
+    answers = __questions(questions)
+    if not answers:
+        raise ValueError('No control question answers given')
+    for number, answer in answers.items():
+        if not 1 <= number <= min(question_count, MAX_QUESTIONS):
+            raise ValueError(f'Unknown control question {number}')
+        if len(answer.split()) != 1:
+            raise ValueError(f'Answer to question {number} should be a single word')
+    return 'q:' + ''.join(f'\n {number}: {answer}' for number, answer in answers.items())
+
+
+def validate(line: int, fields: dict | None, question_count: int) -> Account:
+    if fields is None:
+        raise ValueError('Unreadable record')
+    username = fields.get('username')
+    if not isinstance(username, str) or not NAME_PATTERN.fullmatch(username):
+        raise ValueError('Invalid username')
+    groups = __names(fields.get('groups') or [username])
+    for group in groups:
+        if not NAME_PATTERN.fullmatch(group):
+            raise ValueError(f'Invalid group name: {group}')
+    password, hashed_password = fields.get('password') or None, fields.get('password_hash') or None
+    if (password is None) == (hashed_password is None):
+        raise ValueError('Exactly one of password and password_hash is required')
+    confirmation_methods = __confirmation_methods(fields, question_count)
+    if hashed_password is not None:
+        if not is_hashed(hashed_password) or len(hashed_password.split('$')) != 4:
+            raise ValueError('Unsupported password hash')
+    else:
+        check_password_policy(password)
+        hashed_password = hash_password(password)
+    return Account(line, username, groups, hashed_password, confirmation_methods)
+
+
+def __validate_batch(batch: list[tuple[int, dict | None]], question_count: int) -> list[Account | tuple]:
+    results = []
+    for line, fields in batch:
+        try:
+            results.append(validate(line, fields, question_count))
+        except (ValueError, TypeError) as error:
+            username = fields.get('username') if isinstance(fields, dict) else None
+            results.append((line, username if isinstance(username, str) else None, str(error)))
+    return results
+
+
+def import_users(kernel: Kernel, records: list[tuple[int, dict | None]], workers: int = None,
+                 strict: bool = False, limit: int = None) -> ImportReport:
+    # PBKDF2 releases the GIL, so threads hash passwords in parallel without pickling records
+    report = ImportReport()
+    started = time.perf_counter()
+    question_count = len(kernel.get_control_questions())
+    size = src.variant_options.import_batch_records
+    batches = [records[i:i + size] for i in range(0, len(records), size)]
+    accounts: list[Account] = []
+    seen: set[str] = set()
+    with ThreadPoolExecutor(workers or src.variant_options.import_workers or os.cpu_count()) as executor:
+        for results in executor.map(__validate_batch, batches, [question_count] * len(batches)):
+            for result in results:
+                if isinstance(result, tuple):
+                    report.errors.append(result)
+                elif result.username in seen:
+                    report.errors.append((result.line, result.username, 'Duplicate username in import'))
+                else:
+                    seen.add(result.username)
+                    accounts.append(result)
+    if not (strict and report.errors):
+        rejected = kernel.import_users([(account.username, account.groups, account.hashed_password,
+                                         account.confirmation_methods) for account in accounts], limit)
+        lines = {account.username: account.line for account in accounts}
+        report.errors.extend((lines[username], username, error) for username, error in rejected.items())
+        report.created = [account.username for account in accounts if account.username not in rejected]
+    report.errors.sort(key=lambda error: error[0])
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import users from a CSV or JSON lines file')
+    parser.add_argument('partition')
+    parser.add_argument('records')
+    parser.add_argument('--strict', action='store_true', help='import nothing if any record is rejected')
+    parser.add_argument('-j', '--workers', type=int)
+    parser.add_argument('--limit', type=int, help='users allowed after the import, defaults to max_users_amount')
+    arguments = parser.parse_args()
+    kernel = Kernel(arguments.partition, 'root', ['root'], journal=True)
+    try:
+        report = import_users(kernel, read_records(arguments.records), arguments.workers, arguments.strict,
+                              arguments.limit)
+    finally:
+        kernel.close()
+    for line in report.lines():
+        print(line)
+    sys.exit(1 if report.errors else 0)
+
+
+if __name__ == '__main__':
+    main()
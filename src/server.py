@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+
+from src.auth import verify
+from src.confirmation import ConfirmationScheduler
+from src.kernel import Kernel, USERS_PATH
+from src.locks import PathLocks
+from src.open_files import OpenFileTable
+from src.pipeline import Pipeline, parse_pipeline
+from src.shell import Shell, read_only_stage
+from src.variant_options import confirmation_delay
+
+interactive_commands = {'passwd'}
+transaction_commands = {'begin', 'commit', 'rollback'}
+
+
+class Session:
+    def __init__(self, kernel: Kernel, scheduler: ConfirmationScheduler):
+        self.shell: Shell = Shell(kernel, authenticate=False, scheduler=scheduler)
+        self.username: str | None = None
+        self.groups: list[str] = []
+        self.notices: list[str] = []
+        self.files: OpenFileTable = OpenFileTable()
+
+
+class KernelServer:
+    def __init__(self, kernel: Kernel):
+        self.kernel: Kernel = kernel
+        self.locks: PathLocks = PathLocks()
+        self.scheduler: ConfirmationScheduler = ConfirmationScheduler()
+        self.sessions: dict[Shell, Session] = {}
+
+    @staticmethod
+    def lock_plan(command: list[str], workdir: list[str]) -> tuple[set[tuple], set[tuple]]:
+        def resolve(path: str) -> tuple:
+            return tuple(Kernel.parse_path(path) if path.startswith('/') else workdir + Kernel.parse_path(path))
+
+        match command:
+            case ['exit', *_] | ['confirm', *_] | ['cd'] | ['echo', *_] | ['stats', *_] | ['mount'] | ['mount', _] \
+                    | ['umount'] | ['wc' | 'sort', *_] | ['cat']:
+                return set(), set()
+            case ['ls'] | ['ls', '-l']:
+                return {tuple(workdir)}, set()
+            case ['ls', *_, path]:
+                return {resolve(path)}, set()
+            case ['find', path, *_] if not path.startswith('-'):
+                return {resolve(path)}, set()
+            case ['find', *_]:
+                return {tuple(workdir)}, set()
+            case ['du', *arguments]:
+                paths = [argument for argument in arguments if argument != '-s']
+                return {resolve(paths[0]) if paths else tuple(workdir)}, set()
+            case ['grep', *arguments]:
+                while arguments[:1] in (['-r'], ['-i'], ['-j']) and len(arguments) > 1:
+                    arguments = arguments[2 if arguments[0] == '-j' else 1:]
+                return {resolve(arguments[1]) if len(arguments) > 1 else tuple(workdir)}, set()
+            case ['cd' | 'cat' | 'getfacl' | 'stat', path, *_] | ['head' | 'tail', '-n', _, path] | ['head' | 'tail', path]:
+                return {resolve(path)}, set()
+            case ['head' | 'tail', *_]:
+                return set(), set()
+            case ['setfacl', '-b', path] | ['setfacl', _, _, path]:
+                return set(), {resolve(path)}
+            case ['touch' | 'rm', path, *_]:
+                target = resolve(path)
+                return set(), {target, target[:-1]}
+            case ['userimport', *_, path]:
+                return {resolve(path)}, {USERS_PATH}
+            case ['useradd' | 'usermod' | 'userimport', *_]:
+                return set(), {USERS_PATH}
+        return set(), {()}
+
+    @classmethod
+    def pipeline_plan(cls, pipeline: Pipeline, workdir: list[str]) -> tuple[set[tuple], set[tuple]]:
+        reads, writes = set(), set()
+        for stage in pipeline.stages:
+            stage_reads, stage_writes = cls.lock_plan(stage, workdir)
+            reads |= stage_reads
+            writes |= stage_writes
+        if pipeline.redirect is not None:
+            target = tuple(Kernel.parse_path(pipeline.redirect) if pipeline.redirect.startswith('/')
+                           else workdir + Kernel.parse_path(pipeline.redirect))
+            writes |= {target, target[:-1]}
+        return reads - writes, writes
+
+    def file_call(self, session: Session, function, *args):
+        with self.kernel.as_user(session.username, session.groups):
+            return function(*args)
+
+    async def file_operation(self, session: Session, op: str, request: dict) -> dict:
+        files = session.files
+        if op == 'open':
+            path, mode = request.get('path', ''), request.get('mode', 'r')
+            path = tuple(Kernel.parse_path(path) if path.startswith('/') else
+                         session.shell.workdir + Kernel.parse_path(path))
+            mutating = mode != 'r'
+            if mutating and session.shell.challenge is not None:
+                return {'ok': False, 'error': 'identity confirmation pending'}
+            async with self.locks.hold(set() if mutating else {path}, {path, path[:-1]} if mutating else set()):
+                fd = await asyncio.to_thread(self.file_call, session, files.open, self.kernel, path, mode)
+            return {'ok': True, 'fd': fd}
+        fd = request.get('fd')
+        handle = files.get(fd)
+        match op:
+            case 'read':
+                async with self.locks.hold({handle.path}, set()):
+                    data = await asyncio.to_thread(self.file_call, session, handle.read,
+                                                   request.get('length', -1))
+                return {'ok': True, 'data': data}
+            case 'write':
+                if session.shell.challenge is not None:
+                    return {'ok': False, 'error': 'identity confirmation pending'}
+                async with self.locks.hold(set(), {handle.path}):
+                    written = await asyncio.to_thread(self.file_call, session, handle.write,
+                                                      request.get('data', ''))
+                return {'ok': True, 'written': written}
+            case 'seek':
+                return {'ok': True, 'position': handle.seek(request.get('offset', 0), request.get('whence', 0))}
+            case _:
+                files.close(fd)
+                return {'ok': True}
+
+    def login(self, username: str, password: str, notices: list[str], upgrade: bool) -> bool:
+        with self.kernel.as_user(*self.kernel.default_identity):
+            return verify(self.kernel, username, password, notices, upgrade)
+
+    def execute(self, session: Session, line: str):
+        with self.kernel.as_user(session.username, session.groups):
+            result = session.shell.exec(line)
+            if result is None or isinstance(result, str):
+                return result
+            return '\n'.join(result)
+
+    async def dispatch(self, session: Session, request: dict) -> dict:
+        match request.get('op'):
+            case 'login':
+                username, password = request.get('username', ''), request.get('password', '')
+                notices = []
+                async with self.locks.hold({USERS_PATH}, set()):
+                    verified = await asyncio.to_thread(self.login, username, password, notices, False)
+                if not verified:
+                    return {'ok': False, 'error': 'Wrong password'}
+                if self.kernel.password_needs_upgrade(username):
+                    # a legacy or outdated hash is rewritten on the first login, only that step writes the users section
+                    async with self.locks.hold(set(), {USERS_PATH}):
+                        await asyncio.to_thread(self.login, username, password, [], True)
+                session.notices.extend(notices)
+                session.username = username
+                session.groups = list(self.kernel.groups_of(username))
+                session.shell.schedule_confirmation(confirmation_delay)
+                return {'ok': True, 'prompt': self.prompt(session)}
+            case 'exec':
+                if session.username is None:
+                    return {'ok': False, 'error': 'Not authenticated'}
+                line = request.get('command', '')
+                command = line.split()
+                if not command:
+                    return {'ok': True, 'output': None, 'prompt': self.prompt(session)}
+                try:
+                    pipeline = parse_pipeline(line) if command[0] not in ('exit', 'confirm') else None
+                except ValueError:
+                    pipeline = None  # the shell reports the syntax error without touching the kernel
+                names = pipeline.names if pipeline is not None else command[:1]
+                for name in names:
+                    if name in interactive_commands or name in transaction_commands:
+                        return {'ok': False, 'error': f'{name}: not available in server sessions'}
+                if pipeline is None:
+                    reads, writes = set(), set()
+                else:
+                    reads, writes = self.pipeline_plan(pipeline, session.shell.workdir)
+                if session.shell.challenge is not None and (
+                        pipeline is None or pipeline.redirect is not None
+                        or not all(map(read_only_stage, pipeline.stages))):
+                    reads, writes = set(), set()
+                async with self.locks.hold(reads, writes):
+                    output = await asyncio.to_thread(self.execute, session, line)
+                if session.shell.identity_failed:
+                    self.logout(session)
+                    session.notices.append('Identity not confirmed. Logged out')
+                return {'ok': True, 'output': output, 'prompt': self.prompt(session)}
+            case 'open' | 'read' | 'write' | 'seek' | 'close' as op:
+                if session.username is None:
+                    return {'ok': False, 'error': 'Not authenticated'}
+                return await self.file_operation(session, op, request)
+            case _:
+                return {'ok': False, 'error': 'Unknown operation'}
+
+    @staticmethod
+    def prompt(session: Session) -> str:
+        view = session.shell.view
+        return f'[{session.username}{"@" + view.name if view else ""}] /{"/".join(session.shell.workdir)}> '
+
+    def logout(self, session: Session):
+        self.scheduler.cancel(session.shell)
+        session.username = None
+        session.groups = []
+        session.shell.identity_failed = False
+        session.shell.workdir = []
+        session.shell.view = None
+        session.files.close_all()
+
+    async def confirmations(self):
+        while True:
+            for shell in self.scheduler.pop_due():
+                session = self.sessions.get(shell)
+                if session is not None and session.username is not None:
+                    session.notices.append(shell.start_confirmation(session.username))
+                    if shell.identity_failed:
+                        self.logout(session)
+            await asyncio.to_thread(self.scheduler.wait, 1)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(self.kernel, self.scheduler)
+        self.sessions[session.shell] = session
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    response = await self.dispatch(session, request)
+                except Exception as error:
+                    response = {'ok': False, 'error': str(error)}
+                if session.notices:
+                    response['notices'], session.notices = session.notices, []
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+                if not session.shell.active:
+                    break
+        finally:
+            self.scheduler.cancel(session.shell)
+            session.files.close_all()
+            del self.sessions[session.shell]
+            writer.close()
+
+    async def serve(self, socket_path: str = None, host: str = '127.0.0.1', port: int = None):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+        confirmations = asyncio.create_task(self.confirmations())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            confirmations.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve one kernel to many shell sessions')
+    parser.add_argument('partition', nargs='?', default='disc.json')
+    parser.add_argument('--socket', default='sdss.sock')
+    parser.add_argument('--port', type=int)
+    arguments = parser.parse_args()
+    kernel = Kernel(arguments.partition, 'root', ['root'], journal=True, lazy=True)
+    try:
+        asyncio.run(KernelServer(kernel).serve(None if arguments.port else arguments.socket, port=arguments.port))
+    finally:
+        kernel.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,33 @@
-from src.commands import commands as shell_commands
-from src.kernel import Kernel
+import time
+from typing import Iterator
+
+from src.commands import CommandError, commands as shell_commands, filters as pipe_filters
+from src.kernel import Kernel, SnapshotView, Directory
+from src.pipeline import Pipeline, parse_pipeline
 from src.auth import auth
-from src.variant_options import wrong_login_amount
+from src.confirmation import Challenge, ConfirmationScheduler
+from src.variant_options import wrong_login_amount, confirmation_delay, confirmation_interval
+
+read_only_commands = {'ls', 'cat', 'cd', 'find', 'grep', 'du', 'stats', 'getfacl', 'wc', 'sort', 'echo', 'head',
+                      'tail', 'stat'}
+
+
+def read_only_stage(stage: list[str]) -> bool:
+    return stage[0] in read_only_commands and stage[:2] != ['stats', '-w']
 
 
 class Shell:
-    def __init__(self, kernel: Kernel):
+    def __init__(self, kernel: Kernel, authenticate: bool = True, scheduler: ConfirmationScheduler = None):
         self.kernel: Kernel = kernel
         self.workdir: list = []
         self.active = True
+        self.scheduler: ConfirmationScheduler | None = scheduler
+        self.challenge: Challenge | None = None
+        self.identity_failed: bool = False
+        self.view: SnapshotView | None = None
 
+        if not authenticate:
+            return
         try:
             self.authentication()
         except Exception:
@@ -33,20 +51,162 @@ class Shell:
             print("Too many wrong attempts, register again")
             self.kernel.remove_user(user)
             raise Exception("Failed to login")
+        self.schedule_confirmation(confirmation_delay)
+
+    def reauthenticate(self):
+        self.identity_failed = False
+        self.challenge = None
+        self.workdir = []
+        self.view = None
+        self.authentication()
+
+    def schedule_confirmation(self, delay: float):
+        if self.scheduler is not None:
+            self.scheduler.schedule(self, delay)
+
+    def start_confirmation(self, username: str = None) -> str:
+        try:
+            self.challenge = self.kernel.create_identity_challenge(username or self.kernel.username)
+        except Exception as error:
+            self.fail_confirmation()
+            return str(error)
+        return f'Please, confirm your identity\n{self.challenge.prompt}\nAnswer with: confirm <answer>'
+
+    def confirm(self, answer: str) -> str:
+        if self.challenge is None:
+            return 'confirm: nothing to confirm'
+        if self.challenge.check(answer):
+            self.challenge = None
+            self.schedule_confirmation(confirmation_interval)
+            return 'Identity confirmed'
+        if self.challenge.exhausted:
+            self.fail_confirmation()
+            return 'User not identified'
+        return 'Wrong!'
 
+    def fail_confirmation(self):
+        self.challenge = None
+        self.identity_failed = True
+        if self.scheduler is not None:
+            self.scheduler.cancel(self)
 
     def prompt(self):
-        return f'[{self.kernel.username}] /{"/".join(self.workdir)}> '
+        mounted = f'@{self.view.name}' if self.view is not None else ''
+        return f'[{self.kernel.username}{mounted}] /{"/".join(self.workdir)}> '
+
+    def mount(self, command: list[str]):
+        match command:
+            case ['mount']:
+                return [f'{"/" + "/".join(mount.path)}\t{mount.partition_path}'.expandtabs(24)
+                        for mount in self.kernel.mounts]
+            case ['mount', partition_path, path]:
+                return self.__partition_mount('mount', self.kernel.mount, path, partition_path)
+            case ['umount', path]:
+                return self.__partition_mount('umount', self.kernel.umount, path)
+            case ['mount', name]:
+                try:
+                    self.view = SnapshotView(self.kernel, self.kernel.get_snapshot(name))
+                except ValueError as error:
+                    return CommandError('mount: ' + str(error))
+            case ['umount']:
+                if self.view is None:
+                    return CommandError('umount: no snapshot is mounted')
+                self.view = None
+            case _:
+                return CommandError('USAGE: mount [<snapshot> | <partition> <path>]' if command[0] == 'mount'
+                                    else 'USAGE: umount [path]')
+        self.workdir = []
+
+    def __partition_mount(self, name: str, operation, path: str, *args):
+        path = self.kernel.parse_path(path) if path.startswith('/') else self.workdir + self.kernel.parse_path(path)
+        try:
+            operation(path, *args)
+        except ValueError as error:
+            return CommandError(f'{name}: {error}')
+        except Exception:
+            return CommandError(f'{name}: Access denied')
 
     def exec(self, command: str):
-        command = command.split()
-        if not command:
+        words = command.split()
+        if not words:
             return
-        if command[0] == 'exit':
+        if words[0] == 'exit':
             self.active = False
             return 'exit'
+        if self.challenge is not None and self.challenge.expired:
+            self.fail_confirmation()
+            return 'confirm: challenge expired, user not identified'
+        if words[0] == 'confirm':
+            return self.confirm(' '.join(words[1:]))
+        try:
+            pipeline = parse_pipeline(command)
+        except ValueError as error:
+            return CommandError(f'shell: {error}')
+        names = pipeline.names
+        read_only = pipeline.redirect is None and all(map(read_only_stage, pipeline.stages))
+        if self.challenge is not None and not read_only:
+            return CommandError('shell: identity confirmation pending, answer with: confirm <answer>')
+        if pipeline.simple and names[0] in ('mount', 'umount'):
+            return self.mount(pipeline.stages[0])
+        if self.view is not None and not read_only:
+            return CommandError(f'shell: snapshot {self.view.name} is mounted read-only, use umount first')
+        if names[0] not in shell_commands:
+            return CommandError(f'shell: command not found: {names[0]}')
+        metrics = self.kernel.metrics
+        started = time.perf_counter() if metrics.enabled else 0
+        result = self.__run(pipeline, self.kernel if self.view is None else self.view)
+        if metrics.enabled:
+            if result is None or isinstance(result, str):
+                metrics.observe(names[0], time.perf_counter() - started)
+            else:
+                result = metrics.timed(names[0], result, started)
+        return result
+
+    def __run(self, pipeline: Pipeline, target):
+        result = None
+        for i, stage in enumerate(pipeline.stages):
+            if i == 0:
+                result, workdir = shell_commands[stage[0]](stage, target, self.workdir)
+                if len(pipeline.stages) == 1:
+                    self.workdir = workdir
+            else:
+                handler = pipe_filters.get(stage[0])
+                if handler is None:
+                    message = 'command not found' if stage[0] not in shell_commands else 'does not read from a pipe'
+                    return CommandError(f'shell: {stage[0]}: {message}')
+                result, _ = handler(stage, target, self.workdir, self.__lines(result))
+            if isinstance(result, CommandError):
+                return result
+        if pipeline.redirect is not None:
+            return self.__redirect(pipeline, result)
+        return result
+
+    @staticmethod
+    def __lines(result) -> Iterator[str]:
+        if result is None:
+            return iter(())
+        if isinstance(result, str):
+            return iter(result.split('\n'))
+        return iter(result)
+
+    def __redirect(self, pipeline: Pipeline, result):
+        path = self.kernel.parse_path(pipeline.redirect)
+        if not pipeline.redirect.startswith('/'):
+            path = self.workdir + path
+        content = '\n'.join(self.__lines(result))
         try:
-            result, self.workdir = shell_commands[command[0]](command, self.kernel, self.workdir)
-            return result
-        except KeyError:
-            return f'shell: command not found: {command[0]}'
+            existing = self.kernel.read(path)
+        except ValueError:
+            existing = None
+        if isinstance(existing, Directory):
+            return CommandError(f'shell: {pipeline.redirect}: Is a directory')
+        try:
+            if pipeline.append and existing is not None:
+                self.kernel.append(path, '\n' + content if existing.size else content)
+            else:
+                self.kernel.write(path, content)
+        except ValueError:
+            return CommandError(f'shell: {pipeline.redirect}: Invalid path')
+        except Exception:
+            return CommandError(f'shell: {pipeline.redirect}: Access denied')
+        return None
@@ -0,0 +1,439 @@
+import hashlib
+import json
+import mmap
+import os
+from typing import Iterator
+
+from src.nodes import (NameTable, FileNode, DirNode, LazyContent, AppendedContent, Acl, mode_from_permissions,
+                       permissions_from_mode, node_from_dict, text_size, text_range, text_chunks)
+
+
+class PartitionSource:
+    def __init__(self, path: str):
+        with open(path, 'rb') as partition_file:
+            self.map: mmap.mmap = mmap.mmap(partition_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset: int, length: int) -> str:
+        return self.map[offset:offset + length].decode('ascii')
+
+
+class Snapshot:
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.size: int = 0
+        self.files: list[tuple[FileNode, int, int, int]] = []
+        self.index: dict | None = None
+        self.skeleton: str | None = None
+        self.new_blobs: list = []
+        self.dead_blobs: list[str] = []
+
+    def emit(self, chunk: str):
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+
+
+class JsonStorage:
+    indent = ' ' * 4
+    index_version = 2
+
+    def __init__(self, path: str, lazy: bool = False):
+        self.path: str = path
+        self.lazy: bool = lazy
+        self.source: PartitionSource | None = None
+
+    @property
+    def index_path(self) -> str:
+        return self.path + '.index'
+
+    def store_content(self, content: str):
+        return content
+
+    def append_content(self, data, suffix: str):
+        if data.__class__ is str:
+            return data + suffix
+        if data.__class__ is AppendedContent:
+            return AppendedContent(data.base, data.suffix + suffix)
+        return AppendedContent(data, suffix)
+
+    def release_content(self, data):
+        pass
+
+    def retain_content(self, data):
+        pass
+
+    def node_changed(self, node: FileNode, ancestors: list[DirNode]):
+        node.fragment = None
+        self.tree_changed(ancestors)
+
+    def tree_changed(self, ancestors: list[DirNode]):
+        for node in reversed(ancestors):
+            if node.fragment is None:
+                break
+            node.fragment = None
+
+    def load(self) -> tuple[dict, DirNode, NameTable]:
+        names = NameTable()
+        if self.lazy:
+            index = self.__read_index()
+            if index is not None:
+                self.source = PartitionSource(self.path)
+                root = self.__node_from_index(index['root'], iter(index['files']), names)
+                return index['partition'], root, names
+        # without a current index the partition loads eagerly, the next write lays it out and records the index
+        with open(self.path) as partition_json:
+            partition: dict = json.load(partition_json)
+        root = node_from_dict(partition['filesystem'].pop('root'), names)
+        return partition, root, names
+
+    def __read_index(self) -> dict | None:
+        try:
+            with open(self.index_path) as index_json:
+                index = json.load(index_json)
+            stat = os.stat(self.path)
+        except (OSError, ValueError):
+            return None
+        if index.get('version') != self.index_version or index.get('size') != stat.st_size \
+                or index.get('mtime_ns') != stat.st_mtime_ns:
+            return None
+        return index
+
+    def __node_from_index(self, entry: dict | list, files, names: NameTable) -> FileNode | DirNode:
+        if isinstance(entry, dict):
+            return DirNode({name: self.__node_from_index(child, files, names) for name, child in entry.items()})
+        owner, group, permissions, *acl = entry
+        offset, length, size = next(files)
+        node = FileNode(names.intern(owner), names.intern(group), mode_from_permissions(permissions),
+                        LazyContent(self.source, offset, length, size))
+        if acl:
+            node.acl = Acl.parse(acl[0], names)
+        return node
+
+    def encode(self, partition: dict, root: DirNode, names: NameTable) -> Snapshot:
+        snapshot = Snapshot()
+        partition = dict(partition)
+        if not self.lazy:
+            for chunk in self.encode_document(partition, root, names):
+                snapshot.emit(chunk)
+            return snapshot
+        snapshot.index = dict(partition)
+        partition['filesystem'] = {'root': root, **partition['filesystem']}
+        self.__encode(partition, 0, snapshot, names)
+        snapshot.skeleton = root.fragment[1]
+        return snapshot
+
+    def file_entry(self, node: FileNode, names: NameTable) -> dict:
+        entry = {'type': 'file', 'owner': names.name(node.owner), 'group': names.name(node.group),
+                 'permissions': permissions_from_mode(node.mode)}
+        if node.acl is not None:
+            entry['acl'] = node.acl.entries(names)
+        entry['content'] = node.content
+        return entry
+
+    def encode_document(self, partition: dict, root: DirNode, names: NameTable) -> list[str]:
+        chunks = ['{']
+        for i, (key, value) in enumerate(partition.items()):
+            chunks.append((',\n' if i else '\n') + self.indent + json.dumps(key) + ': ')
+            if key != 'filesystem':
+                chunks.append(self.__dumps(value, 1))
+                continue
+            chunks.append('{\n' + self.indent * 2 + '"root": ')
+            chunks.extend(self.__directory_pieces(root, 2, names))
+            for name, entry in value.items():
+                chunks.append(',\n' + self.indent * 2 + json.dumps(name) + ': ' + self.__dumps(entry, 2))
+            chunks.append('\n' + self.indent + '}')
+        chunks.append('\n}' if len(chunks) > 1 else '}')
+        return chunks
+
+    def __dumps(self, value, level: int) -> str:
+        return json.dumps(value, indent=4).replace('\n', '\n' + self.indent * level)
+
+    def __directory_pieces(self, node: DirNode, level: int, names: NameTable) -> list[str]:
+        inner = self.indent * (level + 1)
+        pieces = ['{\n' + inner + '"type": "directory",\n' + inner + '"content": ']
+        if not node.children:
+            pieces.append('{}')
+        else:
+            separator = '{\n'
+            for name, child in node.children.items():
+                pieces.append(separator + self.indent * (level + 2) + json.dumps(name) + ': ')
+                pieces.append(self.__fragment(child, level + 2, names))
+                separator = ',\n'
+            pieces.append('\n' + inner + '}')
+        pieces.append('\n' + self.indent * level + '}')
+        return pieces
+
+    def __fragment(self, node: FileNode | DirNode, level: int, names: NameTable) -> str:
+        if node.fragment is None:
+            if isinstance(node, FileNode):
+                node.fragment = self.__dumps(self.file_entry(node, names), level)
+            else:
+                node.fragment = ''.join(self.__directory_pieces(node, level, names))
+        return node.fragment
+
+    def __encode(self, value, level: int, snapshot: Snapshot, names: NameTable):
+        if isinstance(value, DirNode):
+            self.__encode_directory(value, level, snapshot, names)
+        elif isinstance(value, dict):
+            self.__encode_pairs(value.items(), level, snapshot, names)
+        elif isinstance(value, list):
+            if not value:
+                snapshot.emit('[]')
+                return
+            inner = '\n' + self.indent * (level + 1)
+            snapshot.emit('[' + inner)
+            for i, item in enumerate(value):
+                if i:
+                    snapshot.emit(',' + inner)
+                self.__encode(item, level + 1, snapshot, names)
+            snapshot.emit('\n' + self.indent * level + ']')
+        else:
+            snapshot.emit(json.dumps(value))
+
+    def __encode_pairs(self, pairs, level: int, snapshot: Snapshot, names: NameTable):
+        inner = '\n' + self.indent * (level + 1)
+        first = True
+        for key, value in pairs:
+            snapshot.emit(('{' if first else ',') + inner + json.dumps(key) + ': ')
+            first = False
+            self.__encode(value, level + 1, snapshot, names)
+        snapshot.emit('{}' if first else '\n' + self.indent * level + '}')
+
+    def __file_header(self, node: FileNode, level: int, names: NameTable) -> str:
+        if node.fragment is None:
+            inner = ',\n' + self.indent * (level + 1)
+            node.fragment = ('{\n' + self.indent * (level + 1) + '"type": "file"' +
+                             inner + '"owner": ' + json.dumps(names.name(node.owner)) +
+                             inner + '"group": ' + json.dumps(names.name(node.group)) +
+                             inner + '"permissions": ' + str(permissions_from_mode(node.mode)) +
+                             (inner + '"acl": ' + json.dumps(node.acl.entries(names)) if node.acl is not None else '') +
+                             inner + '"content": ')
+        return node.fragment
+
+    def __directory_fragment(self, node: DirNode, level: int, names: NameTable) -> tuple[list, str]:
+        # a lazy fragment alternates text with the files whose content stays in the partition file instead of memory,
+        # and carries the subtree's index skeleton, the offsets are listed separately in the order of the files
+        if node.fragment is None:
+            inner = self.indent * (level + 1)
+            template = []
+            text = '{\n' + inner + '"type": "directory",\n' + inner + '"content": '
+            skeleton = []
+            if not node.children:
+                text += '{}'
+            else:
+                separator = '{\n'
+                for name, child in node.children.items():
+                    text += separator + self.indent * (level + 2) + json.dumps(name) + ': '
+                    if isinstance(child, FileNode):
+                        template += [text + self.__file_header(child, level + 2, names), child]
+                        text = '\n' + self.indent * (level + 2) + '}'
+                        entry = [names.name(child.owner), names.name(child.group), permissions_from_mode(child.mode)]
+                        if child.acl is not None:
+                            entry.append(child.acl.entries(names))
+                        skeleton.append(json.dumps(name) + ': ' + json.dumps(entry))
+                    else:
+                        child_template, child_skeleton = self.__directory_fragment(child, level + 2, names)
+                        if len(child_template) == 1:
+                            text += child_template[0]
+                        else:
+                            template.append(text + child_template[0])
+                            template += child_template[1:-1]
+                            text = child_template[-1]
+                        skeleton.append(json.dumps(name) + ': ' + child_skeleton)
+                    separator = ',\n'
+                text += '\n' + inner + '}'
+            template.append(text + '\n' + self.indent * level + '}')
+            node.fragment = (template, '{' + ', '.join(skeleton) + '}')
+        return node.fragment
+
+    def __encode_directory(self, node: DirNode, level: int, snapshot: Snapshot, names: NameTable):
+        template = self.__directory_fragment(node, level, names)[0]
+        chunks, files, offset = snapshot.chunks, snapshot.files, snapshot.size + len(template[0])
+        chunks.append(template[0])
+        for file, text in zip(template[1::2], template[2::2]):
+            data = file.data
+            if data.__class__ is LazyContent:
+                literal, size = data.source.read(data.offset, data.length), data.size
+            else:
+                content = data if data.__class__ is str else data.load()
+                literal, size = json.dumps(content), text_size(content)
+            files.append((file, offset, len(literal), size))
+            chunks += (literal, text)
+            offset += len(literal) + len(text)
+        snapshot.size = offset
+
+    def write(self, snapshot: Snapshot, repoint: bool = True):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as partition_file:
+            partition_file.writelines(snapshot.chunks)
+            partition_file.flush()
+            os.fsync(partition_file.fileno())
+        os.replace(tmp_path, self.path)
+        if not self.lazy:
+            return
+        self.__write_index(snapshot)
+        if repoint:
+            self.source = PartitionSource(self.path)
+            for node, offset, length, size in snapshot.files:
+                node.data = LazyContent(self.source, offset, length, size)
+
+    def __write_index(self, snapshot: Snapshot):
+        stat = os.stat(self.path)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as index_file:
+            index = json.dumps({'version': self.index_version, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                'partition': snapshot.index, 'files': [file[1:] for file in snapshot.files]})
+            index_file.write(index[:-1] + ', "root": ' + snapshot.skeleton + '}')
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        self.source = None
+
+
+class Blob:
+    __slots__ = ('digest', 'store', 'text', 'refs')
+
+    def __init__(self, digest: str, store, text: str | None = None):
+        self.digest: str = digest
+        self.store: BlobStore = store
+        self.text: str | None = text
+        self.refs: int = 0
+
+    def load(self) -> str:
+        if self.text is None:
+            self.text = self.store.read(self.digest)
+        return self.text
+
+    @property
+    def size(self) -> int:
+        if self.text is None:
+            return os.path.getsize(self.store.blob_path(self.digest))
+        return text_size(self.text)
+
+    def range(self, start: int, length: int) -> bytes:
+        if self.text is not None:
+            return text_range(self.text, start, length)
+        with open(self.store.blob_path(self.digest), 'rb') as blob_file:
+            blob_file.seek(start)
+            return blob_file.read(length)
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        if self.text is not None:
+            yield from text_chunks(self.text, chunk_size)
+            return
+        with open(self.store.blob_path(self.digest), 'rb') as blob_file:
+            while chunk := blob_file.read(chunk_size):
+                yield chunk
+
+
+class BlobStore:
+    def __init__(self, path: str):
+        self.path: str = path
+        self.blobs: dict[str, Blob] = {}
+        self.new: list[Blob] = []
+        self.dead: set[str] = set()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def ref(self, digest: str, text: str | None = None) -> Blob:
+        blob = self.blobs.get(digest)
+        if blob is None:
+            blob = self.blobs[digest] = Blob(digest, self, text)
+            if text is not None:
+                self.new.append(blob)
+        blob.refs += 1
+        return blob
+
+    def put(self, text: str) -> Blob:
+        return self.ref(hashlib.sha256(text.encode('utf-8')).hexdigest(), text)
+
+    def release(self, blob: Blob):
+        blob.refs -= 1
+        if not blob.refs:
+            self.dead.add(blob.digest)
+
+    def read(self, digest: str) -> str:
+        with open(self.blob_path(digest), encoding='utf-8') as blob_file:
+            return blob_file.read()
+
+    def collect(self) -> tuple[list[Blob], list[str]]:
+        new = [blob for blob in self.new if blob.refs]
+        dead = [digest for digest in self.dead if not self.blobs[digest].refs]
+        for digest in dead:
+            del self.blobs[digest]
+        self.new, self.dead = [], set()
+        return new, dead
+
+    def write(self, new: list[Blob]):
+        for blob in new:
+            blob_path = self.blob_path(blob.digest)
+            if os.path.exists(blob_path):
+                continue
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            with open(blob_path + '.tmp', 'w', encoding='utf-8') as blob_file:
+                blob_file.write(blob.text)
+                blob_file.flush()
+                os.fsync(blob_file.fileno())
+            os.replace(blob_path + '.tmp', blob_path)
+
+    def remove(self, dead: list[str]):
+        for digest in dead:
+            try:
+                os.remove(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+
+class BlobStorage(JsonStorage):
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.blobs: BlobStore = BlobStore(path + '.blobs')
+
+    def store_content(self, content: str) -> Blob:
+        return self.blobs.put(content)
+
+    def append_content(self, data: Blob, suffix: str) -> Blob:
+        return self.blobs.put(data.load() + suffix)
+
+    def release_content(self, data: Blob):
+        self.blobs.release(data)
+
+    def retain_content(self, data: Blob):
+        data.refs += 1
+
+    def load(self) -> tuple[dict, DirNode, NameTable]:
+        names = NameTable()
+        with open(self.path) as partition_json:
+            partition: dict = json.load(partition_json)
+        root = self.__node_from_dict(partition['filesystem'].pop('root'), names)
+        return partition, root, names
+
+    def __node_from_dict(self, entry: dict, names: NameTable) -> FileNode | DirNode:
+        if entry['type'] == 'directory':
+            return DirNode({name: self.__node_from_dict(child, names) for name, child in entry['content'].items()})
+        data = self.blobs.ref(entry['blob']) if 'blob' in entry else self.blobs.put(entry['content'])
+        node = FileNode(names.intern(entry['owner']), names.intern(entry['group']),
+                        mode_from_permissions(entry['permissions']), data)
+        if 'acl' in entry:
+            node.acl = Acl.parse(entry['acl'], names)
+        return node
+
+    def file_entry(self, node: FileNode, names: NameTable) -> dict:
+        entry = {'type': 'file', 'owner': names.name(node.owner), 'group': names.name(node.group),
+                 'permissions': permissions_from_mode(node.mode)}
+        if node.acl is not None:
+            entry['acl'] = node.acl.entries(names)
+        entry['blob'] = node.data.digest
+        return entry
+
+    def encode(self, partition: dict, root: DirNode, names: NameTable) -> Snapshot:
+        snapshot = Snapshot()
+        for chunk in self.encode_document(partition, root, names):
+            snapshot.emit(chunk)
+        snapshot.new_blobs, snapshot.dead_blobs = self.blobs.collect()
+        return snapshot
+
+    def write(self, snapshot: Snapshot, repoint: bool = True):
+        self.blobs.write(snapshot.new_blobs)
+        super().write(snapshot, repoint)
+        self.blobs.remove(snapshot.dead_blobs)
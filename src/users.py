@@ -0,0 +1,80 @@
+import datetime
+
+
+class UserRecord:
+    __slots__ = ('username', 'password', 'creation_date', 'groups', 'confirmation_methods')
+
+    def __init__(self, username: str, password: str, creation_date: datetime.date, groups: list[str],
+                 confirmation_methods: list[str]):
+        self.username: str = username
+        self.password: str = password
+        self.creation_date: datetime.date = creation_date
+        self.groups: list[str] = groups
+        self.confirmation_methods: list[str] = confirmation_methods
+
+    @property
+    def password_field(self) -> str:
+        return f'{self.password}({self.creation_date})'
+
+    @classmethod
+    def parse(cls, content: str) -> 'UserRecord | None':
+        data = content.split('\n')
+        user_data = data.pop(0).split()
+        if len(user_data) < 3:
+            return None
+        password_string = user_data[1]
+        password = password_string.split('(')[0]
+        date = password_string[password_string.find('(') + 1: password_string.find(')')]
+        try:
+            creation_date = datetime.date.fromisoformat(date)
+        except ValueError:
+            return None
+        return cls(user_data[0], password, creation_date, user_data[2].split(','), data)
+
+
+class UserDirectory:
+    def __init__(self):
+        self.by_name: dict[str, UserRecord | None] = {}
+        self.by_group: dict[str, set[str]] = {}
+
+    def __contains__(self, username: str) -> bool:
+        return username in self.by_name
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __iter__(self):
+        return iter(self.by_name)
+
+    def get(self, username: str) -> UserRecord | None:
+        return self.by_name.get(username)
+
+    def update(self, username: str, content: str):
+        self.__unindex_groups(username)
+        record = UserRecord.parse(content)
+        self.by_name[username] = record
+        if record is not None:
+            for group in record.groups:
+                self.by_group.setdefault(group, set()).add(username)
+
+    def remove(self, username: str):
+        self.__unindex_groups(username)
+        self.by_name.pop(username, None)
+
+    def __unindex_groups(self, username: str):
+        record = self.by_name.get(username)
+        if record is None:
+            return
+        for group in record.groups:
+            members = self.by_group.get(group)
+            if members is not None:
+                members.discard(username)
+                if not members:
+                    del self.by_group[group]
+
+    def users_in_group(self, group: str) -> frozenset[str]:
+        return frozenset(self.by_group.get(group, ()))
+
+    def groups_of(self, username: str) -> tuple[str]:
+        record = self.by_name.get(username)
+        return tuple(record.groups) if record is not None else ()
@@ -11,3 +11,31 @@ password_expire_time = 5  # days
 
 wrong_answers_amount = 4
 wrong_login_amount = 3
+
+journal_sync_batch = 64  # operations per fsync
+journal_sync_interval = 1.0  # seconds
+journal_compaction_size = 4 * 1024 * 1024  # bytes
+
+permission_cache_size = 65536  # cached effective permission masks per (node, user, groups)
+
+confirmation_delay = 20  # seconds after login
+confirmation_interval = 60  # seconds between confirmations
+confirmation_timeout = 120  # seconds to answer a pending challenge
+
+password_hash_iterations = 200_000  # PBKDF2-SHA256 rounds per password hash
+password_salt_bytes = 16
+login_latency_budget = 0.5  # seconds allowed for one uncached password check
+
+grep_parallel_threshold = 2000  # files scanned serially before grep -r starts a thread pool
+grep_batch_files = 64  # files per thread pool task
+grep_workers = None  # thread pool size, None for os.cpu_count()
+
+read_chunk_size = 64 * 1024  # bytes per chunk streamed by cat, head and tail
+max_open_files = 64  # open file handles per session
+max_kernel_open_files = 4096  # open file handles across all sessions
+
+metrics_enabled = True  # per-command latency and kernel counters, False skips all bookkeeping
+metrics_path = None  # Prometheus text file written on Kernel.close and by 'stats -w', e.g. 'sdss.prom'
+
+import_workers = None  # threads validating and hashing imported users, None for os.cpu_count()
+import_batch_records = 64  # records validated per thread pool task